@@ -17,6 +17,8 @@
     along with this program.  If not, see <http://www.gnu.org/licenses/>.
 '''
 
+from __future__ import print_function
+
 #PyElph
 __version__ = '1.4'
 
@@ -43,11 +45,13 @@ import string
 
 
 def usage(msg=""):
-    if msg: print msg
-    print 'Usage:', sys.argv[0], '[options]'
-    print 'options:'
-    print '  -h | --help         - print help message'
-    print '  -v | --version      - print version'
+    if msg: print(msg)
+    print('Usage:', sys.argv[0], '[options]')
+    print('options:')
+    print('  -h | --help         - print help message')
+    print('  -v | --version      - print version')
+    print('Usage:', sys.argv[0], 'batch [options] image|directory ...')
+    print('  (see', sys.argv[0], 'batch --help)')
 
 
 def help():
@@ -59,7 +63,7 @@ def help():
 def parseArguments():
     try:
         opts, args = getopt.getopt(sys.argv[1:], "hv", ["help", "version"])
-    except getopt.GetoptError, err:
+    except getopt.GetoptError as err:
         usage(str(err))  # print help information and exit
         sys.exit(2)
     
@@ -67,7 +71,7 @@ def parseArguments():
         if o in ("-h", "--help"):
             help()
         elif o in ("-v", "--version"):
-            print 'PyElph version:', __version__
+            print('PyElph version:', __version__)
         else:
             assert False, "unhandled option"
     
@@ -117,100 +121,105 @@ def checkDependencies(verbose=False):
     
     # checking Python version
     if verbose:
-        print 'Checking Python version:',
+        print('Checking Python version:', end=' ')
     if sys.version_info[0] == 2 and sys.version_info[1] >= 5:
         if verbose:
-            print sys.version, 'OK'
+            print(sys.version, 'OK')
     else:
-        print 'Unsupported Python version!'
-        print 'Please install Python version 2.5 or 2.6!'
+        print('Unsupported Python version!')
+        print('Please install Python version 2.5 or 2.6!')
         return True 
     
     # checking NumPy dependency
     if verbose:
-        print 'Checking NumPy:',
+        print('Checking NumPy:', end=' ')
     try:
         import numpy
     except ImportError:
         if verbose:
-            print 'Not installed'
+            print('Not installed')
         error.append('NumPy ('+__numpy_version_req_str__+')')
     else:
         numpy_version = numpy.__version__.split('.')
         if not numpy_version[2].isdigit():
             idx = numpy_version[2].find(numpy_version[2].lstrip(string.digits))
             numpy_version[2] = numpy_version[2][:idx] 
-        numpy_version = map(int, numpy_version)
+        numpy_version = list(map(int, numpy_version))
         if checkVersion(numpy_version, __numpy_version_req__):
             if verbose:
-                print 'OK'
+                print('OK')
         else:
-            print 'Unsupported NumPy version!'
+            print('Unsupported NumPy version!')
             error.append('NumPy ('+__numpy_version_req_str__+')')
     
     # checking PIL dependency
     if verbose:
-        print 'Checking PIL:',
+        print('Checking PIL:', end=' ')
     try:
         import Image
     except ImportError:
         if verbose:
-            print 'Not installed'
+            print('Not installed')
         error.append('PIL ('+__pil_version_req_str__+')')
     else:
-        pil_version = map(int, Image.VERSION.split('.'))
+        pil_version = list(map(int, Image.VERSION.split('.')))
         if checkVersion(pil_version, __pil_version_req__):
             if verbose:
-                print 'OK'
+                print('OK')
         else:
-            print 'Unsupported PIL version!'
+            print('Unsupported PIL version!')
             error.append('PIL ('+__pil_version_req_str__+')')
     
     # checking matplotlib dependency
     if verbose:
-        print 'Checking matplotlib:',
+        print('Checking matplotlib:', end=' ')
     try:
         import matplotlib
     except ImportError:
         if verbose:
-            print 'Not installed'
+            print('Not installed')
         error.append('matplotlib ('+__mpl_version_req_str__+')')
     else:
-        mpl_version = map(int, matplotlib.__version__.split('.'))
+        mpl_version = list(map(int, matplotlib.__version__.split('.')))
         if checkVersion(mpl_version, __mpl_version_req__):
             if verbose:
-                print 'OK'
+                print('OK')
         else:
-            print 'Unsupported matplotlib version!'
+            print('Unsupported matplotlib version!')
             error.append('matplotlib ('+__mpl_version_req_str__+')')
             
     # checking wxPython dependency
     if verbose:
-        print 'Checking wxPython:',
+        print('Checking wxPython:', end=' ')
     try:
         import wx
     except ImportError:
         if verbose:
-            print 'Not installed'
+            print('Not installed')
         error.append('wxPython ('+__wx_version_req_str__+')')
     else:
-        wx_version = map(int, wx.__version__.split('.'))
+        wx_version = list(map(int, wx.__version__.split('.')))
         if checkVersion(wx_version, __wx_version_req__):
             if verbose:
-                print 'OK'
+                print('OK')
         else:
-            print 'Unsupported wxPython version!'
+            print('Unsupported wxPython version!')
             error.append('wxPython ('+__wx_version_req_str__+')')
     
     if len(error) > 0:
-        print 'Please install/upgrade the following packages for ',
-        print 'Python version', sys.version,':', ', '.join(error)
+        print('Please install/upgrade the following packages for ', end=' ')
+        print('Python version', sys.version,':', ', '.join(error))
         return False
     
     return True
         
 
 if __name__ == '__main__':
+    # headless mode, does not need wxPython or matplotlib
+    if len(sys.argv) > 1 and sys.argv[1] == 'batch':
+        from batch.Pipeline import runBatch
+        sys.exit(runBatch(sys.argv[2:]))
+    
     parseArguments()
     
     if not checkDependencies(True):
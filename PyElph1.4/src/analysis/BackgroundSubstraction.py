@@ -20,17 +20,23 @@
 
 from numpy import append, array, greater, mean, ones, zeros
 
+from .Lane import levelRange
+
 
 def middleOfGapBackgroundLevels(data, lanes):
-    backg = [lanes[0][0]/2]
+    backg = [lanes[0][0]//2]
     for i in range(len(lanes)-1):
-        backg.append((lanes[i][1] + lanes[i+1][0])/2)
-    backg.append((lanes[-1][1]+data.shape[1])/2)
+        backg.append((lanes[i][1] + lanes[i+1][0])//2)
+    backg.append((lanes[-1][1]+data.shape[1])//2)
     
-    backgLevels = array(data[:, backg[:-1]]/2, dtype='uint32')
-    backgLevels += data[:, backg[1:]]/2
+    backgLevels = array(data[:, backg[:-1]]//2, dtype='uint32')
+    backgLevels += data[:, backg[1:]]//2
     return backgLevels
 
+def halfMean(block):
+    # half of the mean of each row, truncated as the levels are integers
+    return (mean(block, 1)/2).astype('uint32')
+
 def meanGapBackgroundLevels(data, lanes):
     backg = array([[0, lanes[0][0]]])
     for i in range(len(lanes)-1):
@@ -40,9 +46,9 @@ def meanGapBackgroundLevels(data, lanes):
     backgLevels = zeros([data.shape[0], len(lanes)], dtype='uint32')
     for i in range(len(lanes)):
         if backg[i, 0] < backg[i, 1]:
-            backgLevels[:, i] += mean(data[:, backg[i, 0]:backg[i, 1]], 1)/2
+            backgLevels[:, i] += halfMean(data[:, backg[i, 0]:backg[i, 1]])
         if backg[i+1, 0] < backg[i+1, 1]:
-            backgLevels[:, i] += mean(data[:, backg[i+1, 0]:backg[i+1, 1]], 1)/2
+            backgLevels[:, i] += halfMean(data[:, backg[i+1, 0]:backg[i+1, 1]])
     return backgLevels
 
 def backgroundSubstraction(data, lanes,
@@ -50,7 +56,10 @@ def backgroundSubstraction(data, lanes,
     backgLevels = getBackGroundLevels(data, lanes)
     
     idx = 0
-    back = zeros(data.shape, dtype='uint8')
+    dtype = 'uint8'
+    if levelRange(data.dtype) > 255: # 16-bit images
+        dtype = 'uint16'
+    back = zeros(data.shape, dtype=dtype)
     for idxBegin, idxEnd in lanes:
         blockData = backgLevels[:, [idx]] * ones([1, idxEnd - idxBegin])
         back[:, idxBegin:idxEnd] = (data[:, idxBegin:idxEnd] - blockData)\
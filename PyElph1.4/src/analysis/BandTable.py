@@ -0,0 +1,138 @@
+'''
+    PyElph - Columnar table of the bands of a gel
+    Copyright (C) 2012  Ana Brandusa Pavel <anabrandusa@gmail.com>,
+                        Cristian Ioan Vasile <cristian.ioan.vasile@gmail.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+#numpy
+from numpy import arange, argsort, concatenate, insert, searchsorted, zeros
+
+
+# one record per band: lane index, position (x is the middle of the lane, y
+# the row), intensity of the smoothed lane profile, cluster index (-1 before
+# matching) and molecular weight (0 before the weights are computed)
+bandFields = [('lane', 'int32'), ('x', 'int32'), ('y', 'int32'),
+              ('intensity', 'float64'), ('cluster', 'int32'),
+              ('weight', 'float64')]
+
+
+def emptyBands(size=0):
+    records = zeros(size, dtype=bandFields)
+    records['cluster'] = -1
+    return records
+
+def concatenateBands(tables):
+    # joins the tables of consecutive groups of lanes
+    records = []
+    noLanes = 0
+    for table in tables:
+        shifted = table.records.copy()
+        shifted['lane'] += noLanes
+        records.append(shifted)
+        noLanes += table.noLanes
+    if len(records) == 0:
+        return BandTable(0)
+    return BandTable(noLanes, concatenate(records))
+
+#-------------------------------------------------------------------------------
+
+class BandTable(object):
+    # The bands of all lanes in one structured array, sorted by lane and then
+    # by row, so the bands of lane k are the slice offsets[k]:offsets[k+1].
+    # Indexing and iterating give these slices (views), which keeps the
+    # per lane interface of the former list of lists.
+
+    def __init__(self, noLanes, records=None):
+        self.noLanes = noLanes
+        if records is None:
+            records = emptyBands()
+        self.records = records
+        self.updateOffsets()
+
+    def updateOffsets(self):
+        self.offsets = searchsorted(self.records['lane'],
+                                    arange(self.noLanes + 1))
+
+    def __len__(self):
+        return self.noLanes
+
+    def __getitem__(self, k):
+        if not 0 <= k < self.noLanes:
+            raise IndexError('Lane index out of range!')
+        return self.records[self.offsets[k]:self.offsets[k+1]]
+
+    def __iter__(self):
+        for k in range(self.noLanes):
+            yield self[k]
+
+    def __str__(self):
+        return str(self.tolist())
+
+    def tolist(self):
+        # nested lists of [x, y] (or [x, y, cluster] after matching) per lane
+        fields = ['x', 'y']
+        if len(self.records) > 0 and self.records['cluster'].min() >= 0:
+            fields.append('cluster')
+        return [[[int(band[f]) for f in fields] for band in b] for b in self]
+
+    def copy(self):
+        return BandTable(self.noLanes, self.records.copy())
+
+    def dropLanes(self, lanes):
+        # table without the given lanes, the others are renumbered
+        keep = [k for k in range(self.noLanes) if k not in lanes]
+        newIndex = zeros(self.noLanes, dtype='int32')
+        newIndex[keep] = arange(len(keep))
+        mask = zeros(self.noLanes, dtype=bool)
+        mask[keep] = True
+        records = self.records[mask[self.records['lane']]]
+        records['lane'] = newIndex[records['lane']]
+        return BandTable(len(keep), records)
+
+#-------------------------------------------------------------------------------
+
+    def insert(self, lane, x, y, intensity=0):
+        # adds a band, unless the lane has one on that row; the position is
+        # found by bisection; returns True if the band was added
+        begin, end = self.offsets[lane], self.offsets[lane+1]
+        idx = begin + searchsorted(self.records['y'][begin:end], y)
+        if idx < end and self.records['y'][idx] == y:
+            return False
+        band = emptyBands(1)
+        band['lane'], band['x'], band['y'] = lane, x, y
+        band['intensity'] = intensity
+        self.records = insert(self.records, idx, band)
+        self.offsets[lane+1:] += 1
+        return True
+
+    def removeBox(self, x0, y0, x1, y1):
+        # removes the bands inside the rectangle; returns True if any was
+        inside = (x0 <= self.records['x']) & (self.records['x'] <= x1) \
+                 & (y0 <= self.records['y']) & (self.records['y'] <= y1)
+        if not inside.any():
+            return False
+        self.records = self.records[~inside]
+        self.updateOffsets()
+        return True
+
+    def clusters(self, noClusters=None):
+        # indices of the bands of each cluster, in lane order
+        cluster = self.records['cluster']
+        if noClusters == None:
+            noClusters = int(cluster.max()) + 1 if len(cluster) > 0 else 0
+        order = argsort(cluster, kind='mergesort')
+        bounds = searchsorted(cluster[order], arange(noClusters + 1))
+        return [order[bounds[k]:bounds[k+1]] for k in range(noClusters)]
@@ -17,183 +17,182 @@
     along with this program.  If not, see <http://www.gnu.org/licenses/>.
 '''
 
+from __future__ import print_function
 
-from numpy import argsort, array, compress, delete, exp, linspace, log, \
-                  polyfit, polyval, rot90, zeros
+from numpy import arange, argsort, array, compress, delete, exp, \
+                  flatnonzero, log, ones, polyfit, polyval, rot90, zeros
 
-from Lane import extractLevelsFormLanes
+from .BandTable import BandTable, concatenateBands, emptyBands
+from .Lane import extractLevelsArray, extractLevelsFormLanes, levelRange, \
+                 movingAverage
+from .Parallel import mapLanes
 
 
-def extractBands(data, lanes, detectThreshold = 20, filterWidth = 3, filterPasses = 10): # for some images 40 # TODO: filter params in params list
-    bands = [[] for i in range(len(lanes))]
-    k=0
+def findPeaks(levels, thresholds):
+    # the plateaus of each profile are collapsed to their first sample, runs
+    # never cross from one lane (row) to the next
+    size = levels.shape[1]
+    runStarts = ones(levels.shape, dtype=bool)
+    runStarts[:, 1:] = levels[:, 1:] != levels[:, :-1]
+    runStarts = flatnonzero(runStarts)
+    values = levels.ravel()[runStarts]
+    lane = runStarts // size
+    runStarts -= lane * size
     
-    for laneData, idx in extractLevelsFormLanes(data, lanes, filterWidth, filterPasses): # 2, 5; for small images , 1, 3
-        
-#        printLaneLevels(laneData, detectThreshold * (lanes[k][1] - lanes[k][0]))
-         
-        laneDataCompressed = array(laneData)
-        indices = linspace(0, laneData.size-1, laneData.size)
-        j = 1
-        while j < laneDataCompressed.size:
-            if laneDataCompressed[j] == laneDataCompressed[j-1]:
-                laneDataCompressed = delete(laneDataCompressed, j)
-                indices = delete(indices, j)
-            else:
-                j += 1
-                
-        for i in range(1, len(laneDataCompressed)-1):
-            if laneDataCompressed[i-1] < laneDataCompressed[i] \
-               and laneDataCompressed[i+1] < laneDataCompressed[i]:
-                j = int((indices[i] + indices[i+1]-1)/2)
-                if laneData[j] > detectThreshold * (lanes[k][1] - lanes[k][0]):
-                    bands[k].append([idx, j])
-        k += 1
-        
-    return bands
+    # strict local maxima of the collapsed profiles
+    i = arange(1, runStarts.size - 1)
+    peaks = (values[i-1] < values[i]) & (values[i+1] < values[i]) \
+            & (lane[i-1] == lane[i]) & (lane[i+1] == lane[i])
+    i = i[peaks]
+    
+    # middle of the plateau of each maximum
+    lane = lane[i]
+    rows = (runStarts[i] + runStarts[i+1] - 1) // 2
+    
+    strong = levels[lane, rows] > thresholds[lane]
+    return lane[strong], rows[strong]
 
-def bandMatching(bands, threshold = 10):
-    bands[:] = map(lambda x: map(lambda y: y + [-1], x), bands)
-#    print 'Add cluster index field:', bands
-            
-    bands = reduce(lambda x, y: x + y, bands)
-#    print 'Flat bands list:', bands
+def extractBands(data, lanes, detectThreshold = 20, filterWidth = 3, filterPasses = 10, # for some images 40 # TODO: filter params in params list
+                 smoothing = movingAverage, executor = None):
+    if executor != None and len(lanes) > 0:
+        # lanes are independent, each chunk of lanes is detected by a worker
+        return concatenateBands(mapLanes(extractBands, data, lanes,
+                                         (detectThreshold, filterWidth,
+                                          filterPasses, smoothing), executor))
+    
+    if len(lanes) == 0:
+        return BandTable(0)
     
-    bands = sorted(bands, lambda x, y: cmp(x[1], y[1]))
-#    print 'Sorted bands list by height:', bands
+    levels = extractLevelsArray(data, lanes, filterWidth, filterPasses, smoothing) # 2, 5; for small images , 1, 3
     
-    dist = array(bands)[:, 1]
-#    print 'Heights of bands:', dist
+    # the detection threshold is given for 8-bit images
+    thresholds = array([detectThreshold * (idxEnd - idxBegin)
+                        for idxBegin, idxEnd in lanes])
+    thresholds = thresholds * levelRange(data.dtype) // 255
+    middles = array([(idxBegin + idxEnd)//2 for idxBegin, idxEnd in lanes])
+    lane, rows = findPeaks(levels, thresholds)
+    
+    # the peaks come sorted by lane and row, as the table
+    records = emptyBands(len(lane))
+    records['lane'] = lane
+    records['x'] = middles[lane]
+    records['y'] = rows
+    records['intensity'] = levels[lane, rows]
+    return BandTable(len(lanes), records)
 
+def bandMatching(bands, threshold = 10):
+    # Consecutive bands (by height) are joined greedily, the closest first.
+    # The clusters form a union-find forest whose roots keep the lanes of the
+    # cluster (bit set), its lowest and highest row and its creation rank, so
+    # each check and merge is O(1). The clusters are numbered by their
+    # highest band, the cluster index of each band is written to the table
+    # and the clusters are returned as indices of their bands in the table.
+    order = argsort(bands.records['y'], kind='mergesort')
+    lane = bands.records['lane'][order].tolist()
+    height = bands.records['y'][order].tolist()
+    n = len(order)
+#    print 'Sorted bands list by height:', zip(lane, height)
+    
+    parent = [-1] * n # -1 for bands without a cluster
+    size = [1] * n
+    laneBits = [1 << k for k in lane]
+    minY = list(height)
+    maxY = list(height)
+    rank = [n] * n
+    created = [0] # number of clusters created so far
+    
+    def find(i):
+        root = i
+        while parent[root] != root:
+            root = parent[root]
+        while parent[i] != root:
+            parent[i], i = root, parent[i]
+        return root
+    
+    def newCluster(i):
+        parent[i] = i
+        rank[i] = created[0]
+        created[0] += 1
+    
+    def spread(root, top, bottom): # rows spanned by the joined clusters
+        return max(maxY[root], bottom) - min(minY[root], top)
+    
+    def join(root, other):
+        if size[root] < size[other]:
+            root, other = other, root
+        parent[other] = root
+        size[root] += size[other]
+        laneBits[root] |= laneBits[other]
+        minY[root] = min(minY[root], minY[other])
+        maxY[root] = max(maxY[root], maxY[other])
+        rank[root] = min(rank[root], rank[other])
+    
+    dist = array(height, dtype='int64')
     dist = dist[1:] - dist [:-1]
 #    print 'Distances between consecutive bands:', dist
     
-    indices = argsort(dist)
+    # equal gaps are taken from the top; the order quicksort leaves them in
+    # changes with the NumPy version and the CPU
+    indices = argsort(dist, kind='mergesort').tolist()
 #    print 'Indices in sorted vector of distances:', indices
+    dist = dist.tolist()
     
-    k = 0
-    clusters = []
-#    print clusters
     for i in indices:
-#        print '----------------------------------------------------------------'
-        if dist[i] > threshold or bands[i][0] == bands[i+1][0]: #TODO: add proper condition
-#            print 'No match', i, dist[i], bands[i], bands[i+1]
-            if bands[i][2] >= 0 and bands[i+1][2] < 0: # band i has cluster and band i+1 does not have a cluster
-                bands[i+1][2] = k
-                clusters.append([bands[i+1]])
-                k += 1
-            elif bands[i][2] < 0 and bands[i+1][2] >= 0: # band i does not have a cluster and band i+1 has a cluster
-                bands[i][2] = k
-                clusters.append([bands[i]])
-                k += 1
-            elif bands[i][2] < 0 and bands[i+1][2] < 0: # neither have clusters
-                bands[i][2] = k
-                clusters.append([bands[i]])
-                k += 1
-                bands[i+1][2] = k
-                clusters.append([bands[i+1]])
-                k += 1
-        else:
-#            print 'Match', i, dist[i], bands[i], bands[i+1]
-            if (bands[i][2] >= 0 and bands[i+1][2] < 0) or (bands[i][2] < 0 and bands[i+1][2] >= 0): # one band has a cluster the other does not
-#                print 'Cluster 0/1 :', bands[i], bands[i+1]
-                if bands[i][2] >= 0:
-                    cluster = bands[i][2]
-                    newBand = bands[i+1]
-                else:
-                    cluster = bands[i+1][2]
-                    newBand = bands[i]
-                
-                if any(map(lambda band: band[0] == newBand[0], clusters[cluster])): # pentru fiecare componenta din cluster verific daca lane-ul este acelasi (adica x)
-                    newBand[2] = k             # new cluster
-                    clusters.append([newBand])
-                    k += 1
-                else:
-                    if any(map(lambda band: abs(band[1] - newBand[1]) > threshold, clusters[cluster])): # verify is distance is ok
-                        newBand[2] = k             # new cluster
-                        clusters.append([newBand])
-                        k += 1
-                    else:
-                        newBand[2] = cluster
-                        clusters[cluster].append(newBand)
-#                print 'Cluster 0/1 :', bands[i], bands[i+1]
-#            elif bands[i][2] < 0 and bands[i+1][2] > 0: # band i does not have a cluster and band i+1 has a cluster
-#                bands[i][2] = bands[i+1][2]
-            elif bands[i][2] < 0 and bands[i+1][2] < 0: # neither have clusters
-#                print 'Cluster 0/0 :', bands[i], bands[i+1]
-                bands[i][2] = bands[i+1][2] = k
-                clusters.append([bands[i], bands[i+1]])
-                k += 1
-#                print 'Cluster 0/0 :', bands[i], bands[i+1]
-            else: # both have clusters
-#                print 'Cluster 1/1 :', bands[i], bands[i+1]
-                cluster1 = bands[i][2]
-                cluster2 = bands[i+1][2]
-                if not any(map(lambda band1: any(map(lambda band2: band1[0] == band2[0], clusters[cluster2])), clusters[cluster1])):
-#                    print 'Merge valid 1'
-                    if not any(map(lambda band1: any(map(lambda band2: abs(band1[1] - band2[1]) > threshold, clusters[cluster2])), clusters[cluster1])):
-#                        print 'Merge valid 2'
-                        cluster, clusterRemove = min(cluster1, cluster2), max(cluster1, cluster2)
-                        
-                        for band in clusters[clusterRemove]:
-                            band[2] = cluster
-                        clusters[cluster].extend(clusters[clusterRemove])
-                        
-                        del clusters[clusterRemove]
-                        
-                        for cls in clusters[clusterRemove:]:
-                            for band in cls:
-                                band[2] -= 1
-                        k -= 1
-#                print 'Cluster 1/1 :', bands[i], bands[i+1]
-#        print clusters
-
-#    print array(bands)    
-#    clNo = -1
-#    last = -1
-#    for b in bands:
-#        if b[2] != last:
-#            clNo += 1
-#            last = b[2]
-#        b[2] = clNo
-        
-#    print 'No clusters:', k
-#    print array(bands)
-#    for i, b in enumerate(bands):
-#        print array(b), i
-    
-    clusters = map(lambda cl: sorted(cl, lambda x, y: cmp(x[0], y[0])), clusters)
+        j = i + 1
+        if dist[i] > threshold or lane[i] == lane[j]: # no match
+            for band in (i, j):
+                if parent[band] < 0:
+                    newCluster(band)
+        elif parent[i] < 0 and parent[j] < 0:
+            newCluster(i)
+            parent[j] = j
+            join(i, j)
+        elif parent[i] < 0 or parent[j] < 0: # one band joins a cluster
+            if parent[i] < 0:
+                newBand, root = i, find(j)
+            else:
+                newBand, root = j, find(i)
+            if laneBits[root] & laneBits[newBand] \
+               or spread(root, height[newBand], height[newBand]) > threshold:
+                newCluster(newBand)
+            else:
+                parent[newBand] = newBand
+                join(root, newBand)
+        else: # both have clusters
+            root1, root2 = find(i), find(j)
+            if root1 != root2 and not laneBits[root1] & laneBits[root2] \
+               and spread(root1, minY[root2], maxY[root2]) <= threshold:
+                join(root1, root2)
     
-#    minY = [array(zip(*cl)[1]).min() for cl in clusters]
-#    for cl in clusters:
-#        print cl
-#    print 'minY:', minY
-    clusters = sorted(clusters, key=lambda cl: array(zip(*cl)[1]).min())
-    for k, cl in enumerate(clusters):
-        for b in cl:
-            b[2] = k
-        
-#    for cl in clusters:
-#        print cl
-    return clusters
+    # clusters numbered by their highest band, then by creation
+    roots = [find(band) if parent[band] >= 0 else -1 for band in range(n)]
+    clusters = sorted(set(roots) - set([-1]),
+                      key=lambda root: (minY[root], rank[root]))
+    index = dict([(root, k) for k, root in enumerate(clusters)])
+    index[-1] = -1
+    bands.records['cluster'][order] = [index[root] for root in roots]
+    return bands.clusters(len(clusters))
 
 def extractWeightsModel(bands, refWeights, markerLane=0):
-    displ = map(lambda x: x[1], bands[markerLane])
+    displ = bands[markerLane]['y']
     logM = log(refWeights)
 #    return polyfit(displ, logM, 1)
     p = polyfit(logM, displ, 1)
     return array([1/p[0], -p[1]/p[0]])
 
 def computeWeights(bands, model, markerLane=0):
-    weights = map(lambda x: polyval(model, array(map(lambda y: y[1], x))), bands)
-    return map(lambda x: array(exp(x), dtype='int32'), weights)
+    # the weights are kept in the table and returned per lane
+    weights = exp(polyval(model, bands.records['y']))
+    bands.records['weight'] = weights
+    return [array(weights[bands.offsets[k]:bands.offsets[k+1]], dtype='int32')
+            for k in range(len(bands))]
 
 def computeMatchMatrix(bands, noClusters, markerLane=None):
     matrix = zeros([noClusters, len(bands)])
     
-    for k in range(len(bands)):
-        for x, y, cl in bands[k]:
-            matrix[cl, k] = 1
+    matched = bands.records['cluster'] >= 0
+    matrix[bands.records['cluster'][matched],
+           bands.records['lane'][matched]] = 1
     
 #    print matrix
 #    print
@@ -224,11 +223,11 @@ def drawBandMatching(data, bands):
 def generateMatlabPlotLanesData(data, lanes):
     k=1
     for laneData, idx in extractLevelsFormLanes(data, lanes):
-        print 'Lane' + str(k), '=', map(int, laneData), ';'
-        print 'figure(', k, ');hold on;'
-        print 'plot(Lane'+str(k)+');'
-        print 'plot('+str(lanes[k-1][1]-lanes[k-1][0])+'*20*ones(1, length(Lane'+str(k)+')));'
-        print 'hold off;'
+        print('Lane' + str(k), '=', list(map(int, laneData)), ';')
+        print('figure(', k, ');hold on;')
+        print('plot(Lane'+str(k)+');')
+        print('plot('+str(lanes[k-1][1]-lanes[k-1][0])+'*20*ones(1, length(Lane'+str(k)+')));')
+        print('hold off;')
         k = k+1    
 
 #Deprecated
@@ -241,11 +240,11 @@ def generateMatlabPlotBandsData(data, lanes, bands):
         idxEnd = lanes[k][1]
         j=0
         for y, x in b:
-            print 'Band' + str(k)+ str(j), '=', map(int, data[x, idxBegin:idxEnd]), ';'
-            print 'plot(Band' + str(k)+ str(j) + ')'
-            print "xlabel('Lane " + str(k) + ' Band ' + str(j) + "')"
-            print 'ylim([0, 255])'
-            print 'pause'
+            print('Band' + str(k)+ str(j), '=', list(map(int, data[x, idxBegin:idxEnd])), ';')
+            print('plot(Band' + str(k)+ str(j) + ')')
+            print("xlabel('Lane " + str(k) + ' Band ' + str(j) + "')")
+            print('ylim([0, 255])')
+            print('pause')
             j += 1
         k+=1
 
@@ -254,7 +253,7 @@ if __name__ == "__main__": pass
 #TODO: redo test code
 #    from numpy import savetxt
 #    from BackgroundSubstraction import backgroundSubstraction
-#    from Lane import extractLevelsFormLanes, drawLanes, extractLanes, printLaneLevels
+#    from .Lane import extractLevelsFormLanes, drawLanes, extractLanes, printLaneLevels
 #    from PhylTree import distanceMatrix, neighbourJoining, similarityMatrix, showTree
 #
 #    data = <TODO>
@@ -0,0 +1,256 @@
+'''
+    PyElph - Gel image backend with memory-mapped TIFF loading
+    Copyright (C) 2012  Ana Brandusa Pavel <anabrandusa@gmail.com>,
+                        Cristian Ioan Vasile <cristian.ioan.vasile@gmail.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+from __future__ import with_statement
+import os
+import struct
+
+#PIL
+try:
+    from PIL import Image
+except ImportError:
+    import Image
+
+#numpy
+from numpy import arange, array, asarray, clip, memmap, rot90
+
+
+# TIFF tags
+tiffImageWidth = 256
+tiffImageLength = 257
+tiffBitsPerSample = 258
+tiffCompression = 259
+tiffPhotometric = 262
+tiffStripOffsets = 273
+tiffSamplesPerPixel = 277
+tiffRowsPerStrip = 278
+tiffStripByteCounts = 279
+tiffMaxSampleValue = 281
+tiffPlanarConfig = 284
+tiffTileWidth = 322
+tiffSampleFormat = 339
+
+# TIFF field types used by the image layout tags: SHORT and LONG
+tiffTypes = {3 : ('H', 2), 4 : ('I', 4)}
+
+
+def readTiffTags(filename):
+    # returns the byte order and the tags of the first image of a TIFF file
+    with open(filename, 'rb') as f:
+        byteOrder = f.read(2)
+        if byteOrder == b'II':
+            endian = '<'
+        elif byteOrder == b'MM':
+            endian = '>'
+        else:
+            return None, None
+        magic, ifdOffset = struct.unpack(endian + 'HI', f.read(6))
+        if magic != 42: # not a TIFF or a BigTIFF
+            return None, None
+
+        f.seek(ifdOffset)
+        noTags = struct.unpack(endian + 'H', f.read(2))[0]
+        entries = [struct.unpack(endian + 'HHI4s', f.read(12))
+                   for k in range(noTags)]
+
+        tags = {}
+        for tag, fieldType, count, value in entries:
+            if fieldType not in tiffTypes:
+                continue
+            fmt, size = tiffTypes[fieldType]
+            if count * size > 4: # value stored elsewhere in the file
+                f.seek(struct.unpack(endian + 'I', value)[0])
+                value = f.read(count * size)
+            tags[tag] = struct.unpack(endian + fmt * count,
+                                      value[:count * size])
+    return endian, tags
+
+def sampleBits(data, tags=None):
+    # bits used by the samples of a 16-bit image, 12 and 14-bit scanners
+    # store theirs in 16 bits: from the MaxSampleValue tag of TIFF files,
+    # otherwise from the actual maximum of the image
+    if tags != None and tiffMaxSampleValue in tags:
+        maxValue = tags[tiffMaxSampleValue][0]
+    elif data.size > 0:
+        maxValue = int(data.max())
+    else:
+        maxValue = 0
+    return min(8 * data.dtype.itemsize, max(8, int(maxValue).bit_length()))
+
+def mapTiff(filename):
+    # memory-maps uncompressed grayscale TIFF files (8 or 16 bits per pixel)
+    # stored in contiguous strips; returns None for any other layout
+    try:
+        endian, tags = readTiffTags(filename)
+    except (IOError, struct.error):
+        return None
+    if tags == None or tiffStripOffsets not in tags or tiffTileWidth in tags:
+        return None
+
+    tag = lambda key, default=1: tags.get(key, (default,))[0]
+    width, height = tag(tiffImageWidth, 0), tag(tiffImageLength, 0)
+    bits = tag(tiffBitsPerSample)
+    if width == 0 or height == 0 or bits not in (8, 16) \
+       or tag(tiffCompression) != 1 or tag(tiffSamplesPerPixel) != 1 \
+       or tag(tiffSampleFormat) != 1 or tag(tiffPhotometric) not in (0, 1):
+        return None
+
+    # the strips have to follow each other without gaps
+    rowBytes = width * bits // 8
+    stripBytes = min(tag(tiffRowsPerStrip, height), height) * rowBytes
+    offsets = tags[tiffStripOffsets]
+    for k, offset in enumerate(offsets):
+        if offset != offsets[0] + k * stripBytes:
+            return None
+    if offsets[0] + height * rowBytes > os.path.getsize(filename):
+        return None
+
+    dtype = 'u1'
+    if bits == 16:
+        dtype = endian + 'u2'
+    data = memmap(filename, dtype=dtype, mode='r', offset=offsets[0],
+                  shape=(height, width))
+    if bits == 16:
+        bits = sampleBits(data, tags)
+    return GelImage(data, invert=tag(tiffPhotometric) == 0, bits=bits)
+
+def openGelImage(filename):
+    # large uncompressed TIFF scans are mapped, everything else goes to PIL;
+    # 16-bit images keep their full range, the rest are converted to 8 bits
+    if os.path.splitext(filename)[1].lower() in ('.tif', '.tiff'):
+        image = mapTiff(filename)
+        if image != None:
+            return image
+    
+    image = Image.open(filename)
+    if image.mode in ('I;16', 'I;16L', 'I;16B'):
+        data = asarray(image).astype('uint16')
+    elif image.mode == 'I': # 16-bit PNG files
+        data = clip(asarray(image), 0, 65535).astype('uint16')
+    else:
+        return GelImage(asarray(image.convert('L')))
+
+    tags = None
+    if image.format == 'TIFF':
+        try:
+            tags = readTiffTags(filename)[1]
+        except (IOError, struct.error):
+            pass
+    return GelImage(data, bits=sampleBits(data, tags))
+
+#-------------------------------------------------------------------------------
+
+class GelImage(object):
+    # Grayscale image with the part of the PIL Image interface used by the
+    # image view. Crop, thumbnail and the rotations by multiples of 90 degrees
+    # only change the view over the pixels, which are read (and inverted or
+    # reduced to 8 bits) when the image is converted to an array. Samples of
+    # fewer bits than their type are spread over its whole range, so that the
+    # analysis sees 12 and 14-bit scans like 16-bit ones.
+
+    def __init__(self, data, invert=False, shift=None, bits=None):
+        self.data = data
+        self.invert = invert
+        self.shift = shift # bits dropped when converted to 8 bits
+        if bits == None:
+            bits = 8 * data.dtype.itemsize
+        self.bits = bits # bits used by the samples
+
+    @property
+    def size(self):
+        return self.data.shape[1], self.data.shape[0]
+
+    @property
+    def mode(self):
+        if self.data.dtype.itemsize == 1 or self.shift != None:
+            return 'L'
+        return 'I;16'
+
+    def __array__(self, dtype=None):
+        data = self.data
+        typeBits = 8 * data.dtype.itemsize
+        if self.invert and self.bits < typeBits:
+            data = ((1 << self.bits) - 1) - data
+        elif self.invert:
+            data = ~data
+        if self.shift != None:
+            data = (data >> self.shift).astype('uint8')
+        elif self.bits < typeBits:
+            data = data << (typeBits - self.bits)
+        data = array(data, dtype=dtype) # a copy, never the mapped file
+        return data
+
+    def copy(self):
+        # the pixels are never modified, so the view can be shared
+        return GelImage(self.data, self.invert, self.shift, self.bits)
+
+    def convert(self, mode):
+        if mode != 'L':
+            raise ValueError('Unsupported image mode %s!' % mode)
+        if self.mode == 'L':
+            return self.copy()
+        return GelImage(self.data, self.invert, self.bits - 8, self.bits)
+
+    def crop(self, box):
+        x0, y0, x1, y1 = [int(round(v)) for v in box]
+        width, height = self.size
+        x0, x1 = max(0, min(x0, width)), max(0, min(x1, width))
+        y0, y1 = max(0, min(y0, height)), max(0, min(y1, height))
+        return GelImage(self.data[y0:y1, x0:x1], self.invert, self.shift,
+                        self.bits)
+
+    def thumbnail(self, size):
+        # in place like PIL, by sampling rows and columns, so only the pixels
+        # of the preview are read
+        width, height = self.size
+        scale = max(float(width) / size[0], float(height) / size[1])
+        if scale > 1:
+            cols = arange(max(1, int(round(width / scale)))) * scale
+            rows = arange(max(1, int(round(height / scale)))) * scale
+            self.data = self.data[rows.astype(int)[:, None], cols.astype(int)]
+
+    def subsample(self, step):
+        # every step-th row and column, as a view
+        return GelImage(self.data[::step, ::step], self.invert, self.shift,
+                        self.bits)
+
+    def transpose(self, method):
+        if method == Image.FLIP_LEFT_RIGHT:
+            data = self.data[:, ::-1]
+        elif method == Image.FLIP_TOP_BOTTOM:
+            data = self.data[::-1]
+        elif method == Image.ROTATE_90: # counter clockwise, as in PIL
+            data = rot90(self.data, 1)
+        elif method == Image.ROTATE_180:
+            data = self.data[::-1, ::-1]
+        elif method == Image.ROTATE_270:
+            data = rot90(self.data, 3)
+        else:
+            raise ValueError('Unsupported transpose method %s!' % method)
+        return GelImage(data, self.invert, self.shift, self.bits)
+
+    def rotate(self, angle, expand=False):
+        # arbitrary angles need the pixels, so the rotation is done by PIL
+        data = asarray(self)
+        if data.dtype.itemsize == 1:
+            rotated = Image.fromarray(data).rotate(angle, expand=expand)
+            return GelImage(asarray(rotated))
+        rotated = Image.fromarray(data.astype('int32')).rotate(angle,
+                                                              expand=expand)
+        return GelImage(asarray(rotated).astype(data.dtype))
@@ -18,42 +18,64 @@
 '''
 
 
-from numpy import array, greater, mean
+from numpy import allclose, argsort, array, ceil, concatenate, convolve, \
+                  cumsum, diff, dot, empty_like, eye, flatnonzero, greater, \
+                  log2, ones, split, vstack, zeros
+from numpy.fft import irfft, rfft
 
+from .Parallel import mapLanes
+
+
+def levelRange(dtype):
+    # largest intensity of the image type, 16-bit scans keep their full range
+    if dtype.kind == 'u' and dtype.itemsize == 2:
+        return 65535
+    return 255
+
+def laneRuns(laneData, threshold):
+    # run-length encoding of the profile above threshold: rising edges give
+    # the lane beginnings, falling edges the (exclusive) lane ends; the mask is
+    # padded with zeros so that lanes touching the image borders are kept
+    mask = greater(laneData, threshold).astype('int8')
+    edges = diff(concatenate(([0], mask, [0])))
+    return flatnonzero(edges == 1), flatnonzero(edges == -1)
 
 def laneSpectrum(laneData, threshold):
-    laneData = ''.join(map(str, greater(laneData, threshold)*1))
-
-    lanes = []
-    idxEnd = 0
-    while True:
-        idxBegin = laneData.find('1', idxEnd)
-        if idxBegin == -1:
-            break;
-        idxEnd = laneData.find('0', idxBegin)
-        if idxEnd == -1:
-#            idxEnd = len(laneData)
-            break
-        
-        lanes.append((idxBegin, idxEnd))
-    
-    return lanes
+    idxBegin, idxEnd = laneRuns(laneData, threshold)
+    return list(zip(idxBegin.tolist(), idxEnd.tolist()))
 
 def computeMeanLaneWidth(laneData, level):
-    laneLengths = array(map(lambda x: x[1] - x[0], laneSpectrum(laneData, level)))
+    idxBegin, idxEnd = laneRuns(laneData, level)
+    laneLengths = idxEnd - idxBegin
 #    print laneLengths
     
     meanLaneWidth = laneLengths.mean()
-    laneLengths2 = array(filter(lambda x: meanLaneWidth <= x, laneLengths))
+    laneLengths2 = laneLengths[meanLaneWidth <= laneLengths]
 
     meanLaneWidth = laneLengths2.mean()
-    laneLengths3 = array(filter(lambda x: meanLaneWidth*0.75 <= x <= meanLaneWidth * 1.25, laneLengths2))
+    laneLengths3 = laneLengths2[(meanLaneWidth*0.75 <= laneLengths2)
+                                & (laneLengths2 <= meanLaneWidth*1.25)]
     
     if len(laneLengths3) == 0:
         return max(laneLengths2)
     
     return laneLengths3.mean()
 
+def findRoot(parent, idx):
+    root = idx
+    while parent[root] != root:
+        root = parent[root]
+    while parent[idx] != root:
+        parent[idx], idx = root, parent[idx]
+    return root
+
+def mergeRuns(parent, runBegin, runEnd, firstLane, left, right):
+    # left and right are the roots of two adjacent runs
+    parent[right] = left
+    runEnd[left] = runEnd[right]
+    if firstLane[left] == None:
+        firstLane[left] = firstLane[right]
+
 def extractLanes(data, proc = 0.25, highTh = 0.70, lowTh = 0.15, meanLaneWidth = None):
     laneData = data.max(0)
     minLevel = laneData.min()
@@ -63,63 +85,160 @@ def extractLanes(data, proc = 0.25, highTh = 0.70, lowTh = 0.15, meanLaneWidth =
         absThH = minLevel + highTh * (maxLevel - minLevel)
         meanLaneWidth = computeMeanLaneWidth(laneData, absThH)
     
-    lanes = []
-    for level in range(maxLevel, int(minLevel + lowTh*(maxLevel-minLevel)), -1):
-        lanes2 = laneSpectrum(laneData, level)
-    #    print 'Low conf lanes:', lanes2
-    #    data2 = array(data)
-    #    drawLanes(data2, lanes2)
+    lowLevel = int(minLevel + lowTh*(maxLevel-minLevel))
+    
+    # a column belongs to the lane spectrum of every integer level strictly
+    # below its value, so sweeping the levels from high to low only adds
+    # columns; runs grow by merging with their neighbours (union-find)
+    birth = ceil(laneData.astype('float64')).astype('int64') - 1
+    selected = flatnonzero(birth > lowLevel)
+    order = selected[argsort(-birth[selected], kind='mergesort')]
+    levelGroups = split(order, flatnonzero(diff(birth[order])) + 1)
+    
+    width = laneData.size
+    parent = list(range(width))
+    runBegin = list(range(width))
+    runEnd = list(range(1, width+1))
+    firstLane = [None] * width # leftmost accepted lane inside the run
+    active = [False] * width
+    
+    accepted = set()
+    for group in levelGroups:
+        group = group.tolist()
+        for k in group:
+            active[k] = True
+            if k > 0 and active[k-1]:
+                mergeRuns(parent, runBegin, runEnd, firstLane,
+                          findRoot(parent, k-1), k)
+            if k+1 < width and active[k+1]:
+                mergeRuns(parent, runBegin, runEnd, firstLane,
+                          findRoot(parent, k), findRoot(parent, k+1))
         
-        i = 0
-        for lane2 in lanes2:
-    #        print '----------------------------------------------------------------'
-    #        print 'Current low conf lane:', lane2
-            if abs((lane2[1] - lane2[0]) - meanLaneWidth) < proc * meanLaneWidth: # daca latimea este buna
-    #            print 'Current low conf lane:', lane2, ', accepted'
-                
-                idx = -1
-                for j in range(len(lanes[i:])):
-    #                print 'Compare with:', lanes[i+j]
-                    if lane2[0] <= lanes[i+j][0]:
-                        idx = i+j
-                        break
-                
-                if idx >= 0:
-    #                print 'Found match:', idx, lanes[idx] 
-                    i = idx
-                    if lane2[1] >= lanes[i][1]:
-                        lanes[i] = lane2
-                    else:
-                        lanes.insert(i, lane2)
-                        i += 1
-                else:
-    #                print 'Match not found'
-                    lanes.append(lane2)
-                    i = len(lanes)
-    #        print '----------------------------------------------------------------'
+        for root in set(findRoot(parent, k) for k in group):
+            lane = (runBegin[root], runEnd[root])
+            if abs((lane[1] - lane[0]) - meanLaneWidth) < proc * meanLaneWidth: # daca latimea este buna
+                # the new lane replaces the leftmost lane it contains
+                if firstLane[root] != None:
+                    accepted.remove(firstLane[root])
+                accepted.add(lane)
+                firstLane[root] = lane
     
+    lanes = sorted(accepted)
     return lanes, meanLaneWidth
 
-def extractLevelsFormLanes(data, lanes, windowWidth = 3, passes = 10):
-    laneLevels = []
-    for idxBegin, idxEnd in lanes:
-        idxMiddle = (idxBegin + idxEnd)/2
-#        laneLevels.append((data[:, idxMiddle], idxMiddle))
-        laneLevel = data[:, idxBegin:idxEnd].sum(1)
+def movingAverage(levels, windowWidth, passes):
+    # moving average over the rows of levels, applied passes times; the first
+    # and last windowWidth samples of each row are left untouched and integer
+    # profiles are truncated after every pass, like the per sample mean did
+    x = array(levels)
+    size = x.shape[1]
+    n = 2*windowWidth + 1
+    if size < n:
+        return x
+    
+    window = zeros((x.shape[0], size + 1), dtype=x.dtype)
+    for i in range(passes):
+        cumsum(x, 1, out=window[:, 1:])
+        sums = window[:, n:] - window[:, :-n]
+        if x.dtype.kind in 'iu':
+            x[:, windowWidth:size-windowWidth] = sums // n
+        else:
+            x[:, windowWidth:size-windowWidth] = sums / float(n)
+    return x
+
+# box filter applied passes times, as one kernel plus the response of the
+# untouched borders; cached per (windowWidth, passes) pair
+smoothingKernels = {}
+smoothingKernelsOrder = []
+maxSmoothingKernels = 8
+
+def smoothingKernel(windowWidth, passes):
+    key = (windowWidth, passes)
+    if key not in smoothingKernels:
+        if len(smoothingKernelsOrder) >= maxSmoothingKernels:
+            del smoothingKernels[smoothingKernelsOrder.pop(0)]
         
-        x = array(laneLevel)
+        n = 2*windowWidth + 1
+        kernel = ones(1)
         for i in range(passes):
-            y = array(x)
-            for t in range(windowWidth, x.size - windowWidth):
-                y[t] = mean(x[t-windowWidth:t+windowWidth+1])
-            x = array(y)
+            kernel = convolve(kernel, ones(n)/n)
+        
+        # impulse responses of the first 2*margin samples on the first margin
+        # outputs; farther samples are not affected by the fixed borders
+        margin = passes * windowWidth
+        border = movingAverage(eye(2*margin), windowWidth, passes)[:, :margin]
         
-        laneLevels.append((x, idxMiddle))
+        smoothingKernels[key] = kernel, border
+        smoothingKernelsOrder.append(key)
+    return smoothingKernels[key]
+
+def kernelMovingAverage(levels, windowWidth, passes):
+    # same as movingAverage without the truncation, but with a single
+    # convolution whose cost does not depend on the number of passes
+    x = array(levels, dtype='float64')
+    size = x.shape[1]
+    margin = passes * windowWidth
+    if margin == 0 or size <= 2*margin:
+        return movingAverage(x, windowWidth, passes)
+    
+    kernel, border = smoothingKernel(windowWidth, passes)
+    
+    y = empty_like(x)
+    nfft = 2**int(ceil(log2(size + kernel.size - 1)))
+    spectrum = rfft(x, nfft, 1) * rfft(kernel, nfft)
+    y[:, margin:size-margin] = irfft(spectrum, nfft, 1)[:, 2*margin:size]
+    y[:, :margin] = dot(x[:, :2*margin], border)
+    y[:, size-margin:] = dot(x[:, :-2*margin-1:-1], border)[:, ::-1]
+    return y
+
+def validatedMovingAverage(levels, windowWidth, passes):
+    y = kernelMovingAverage(levels, windowWidth, passes)
+    reference = movingAverage(array(levels, dtype='float64'), windowWidth,
+                              passes)
+    if not allclose(y, reference):
+        raise ValueError('Smoothing kernel (%d, %d) does not match the '
+                         'iterative filter!' % (windowWidth, passes))
+    return y
+
+# smoothing engines of the lane profiles by name: the iterative filter
+# truncates integer profiles after every pass, the kernel does not, so the
+# two can put a peak one row apart; the checked kernel is compared with the
+# iterative filter without truncation and fails when they differ
+smoothingMethods = {'Iterative' : movingAverage,
+                    'Kernel' : kernelMovingAverage,
+                    'Kernel (Checked)' : validatedMovingAverage,
+                   }
+
+def extractLevelsArray(data, lanes, windowWidth = 3, passes = 10,
+                       smoothing = movingAverage, executor = None):
+    # smoothed lane profiles, one row per lane
+    if len(lanes) == 0:
+        return zeros((0, data.shape[0]))
+    if executor != None:
+        return vstack(mapLanes(extractLevelsArray, data, lanes,
+                               (windowWidth, passes, smoothing), executor))
+    
+    levels = array([data[:, idxBegin:idxEnd].sum(1)
+                    for idxBegin, idxEnd in lanes])
+    return smoothing(levels, windowWidth, passes)
+
+def extractLevelsFormLanes(data, lanes, windowWidth = 3, passes = 10,
+                           smoothing = movingAverage, executor = None):
+    if len(lanes) == 0:
+        return []
+    
+    levels = extractLevelsArray(data, lanes, windowWidth, passes, smoothing,
+                                executor)
+    
+    laneLevels = []
+    for k, (idxBegin, idxEnd) in enumerate(lanes):
+        idxMiddle = (idxBegin + idxEnd)//2
+        laneLevels.append((levels[k], idxMiddle))
     return laneLevels
 
 def getRawLaneLevels(data, lane):
     idxBegin, idxEnd = lane
-    idxMiddle = (idxBegin + idxEnd)/2
+    idxMiddle = (idxBegin + idxEnd)//2
     return data[:, idxMiddle]
 
 
@@ -132,7 +251,7 @@ def printLaneLevels(laneLevels, detectionThreshold=0.20):
     
     plt.figure()
     x = range(len(laneLevels))
-    plt.plot(x, map(int, laneLevels), 'b', \
+    plt.plot(x, list(map(int, laneLevels)), 'b', \
              x, [detectionThreshold]*len(laneLevels), 'k')
     plt.show()
 
@@ -146,7 +265,7 @@ def printLaneSpectrum(data, filename, thH=0.70, thL=0.20):
     
     plt.figure()
     x = range(len(laneData))
-    plt.plot(x, map(int, laneData), 'b', \
+    plt.plot(x, list(map(int, laneData)), 'b', \
              x, [absThH]*len(laneData), 'k', \
              x, [absThL]*len(laneData), 'k')
 #    plt.savefig(filename)
@@ -0,0 +1,100 @@
+'''
+    PyElph - Lane-parallel processing
+    Copyright (C) 2012  Ana Brandusa Pavel <anabrandusa@gmail.com>,
+                        Cristian Ioan Vasile <cristian.ioan.vasile@gmail.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
+
+from numpy import ndarray
+
+try:
+    from multiprocessing import shared_memory
+except ImportError: # Python < 3.8, the image is pickled once per chunk
+    shared_memory = None
+
+try:
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+except ImportError: # Python 2 without the futures backport
+    ProcessPoolExecutor = ThreadPoolExecutor = None
+
+
+def lanePool(processes=None):
+    # process pool usable as the executor of the lane-parallel functions
+    if ProcessPoolExecutor != None:
+        return ProcessPoolExecutor(processes)
+    from multiprocessing import Pool
+    return Pool(processes)
+
+def isThreadExecutor(executor):
+    if ThreadPoolExecutor != None and isinstance(executor, ThreadPoolExecutor):
+        return True
+    return isinstance(executor, ThreadPool)
+
+def laneChunks(lanes, noChunks):
+    # contiguous groups of lanes, so that the results keep the lane order
+    noChunks = max(1, min(noChunks, len(lanes)))
+    size, extra = divmod(len(lanes), noChunks)
+    chunks = []
+    idx = 0
+    for k in range(noChunks):
+        step = size + (k < extra)
+        chunks.append(lanes[idx:idx+step])
+        idx += step
+    return chunks
+
+def runChunk(task):
+    worker, data, lanes, args = task
+    if not isinstance(data, tuple):
+        return worker(data, lanes, *args)
+
+    # attach to the image shared by the parent process
+    name, shape, dtype = data
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        data = ndarray(shape, dtype=dtype, buffer=block.buf)
+        result = worker(data, lanes, *args)
+        del data
+    finally:
+        block.close()
+    return result
+
+def mapLanes(worker, data, lanes, args=(), executor=None, noChunks=None):
+    # calls worker(data, lanesChunk, *args) for contiguous chunks of lanes and
+    # returns the results in lane order
+    if noChunks == None:
+        noChunks = cpu_count()
+    chunks = laneChunks(lanes, noChunks)
+    if executor == None:
+        return [worker(data, chunk, *args) for chunk in chunks]
+
+    block = None
+    shared = data
+    if shared_memory != None and not isThreadExecutor(executor):
+        block = shared_memory.SharedMemory(create=True,
+                                           size=max(1, data.nbytes))
+        ndarray(data.shape, dtype=data.dtype, buffer=block.buf)[...] = data
+        shared = (block.name, data.shape, data.dtype.str)
+
+    try:
+        return list(executor.map(runChunk,
+                         [(worker, shared, chunk, args) for chunk in chunks]))
+    finally:
+        if block != None:
+            block.close()
+            block.unlink()
@@ -17,73 +17,185 @@
     along with this program.  If not, see <http://www.gnu.org/licenses/>.
 '''
 
-
+from __future__ import print_function
 import math
 
-from numpy import append, array, argmin, argwhere, delete, eye, linspace, \
-                  ones, take, \
-                  transpose, unravel_index, zeros
+from numpy import allclose, arange, array, argwhere, dot, errstate, \
+                  fill_diagonal, inf, isfinite, lexsort, maximum, minimum, \
+                  newaxis, ones, packbits, repeat, subtract, zeros
 
 
-def similarityMatrix(data):
-    # dice(i, j) = 2*n_ij/(n_i + n_j)
+# number of set bits of every byte value
+popCount = array([bin(k).count('1') for k in range(256)], dtype='uint8')
+
+# match matrices with more entries are not converted to floats for the
+# matrix product, their columns are compared as bit strings
+maxProductSize = 2**24
+
+# relative difference of Q values taken as a tie by neighbour joining, more
+# than the rounding of the row sums updated at each join
+tieTolerance = 1e-10
+
+# clusters apart that two bands can be and still match, for the position
+# tolerance Dice; the clusters are numbered from the top of the gel
+clusterTolerance = 1
+
+
+def sharedBands(data, other=None):
+    # n_ij, the number of clusters where sample i of data and sample j of
+    # other (default data) both have bands
+    if other is None:
+        other = data
+    if data.size > 0 and max(data.max(), other.max()) > 1:
+        # more bands of a sample in the same cluster
+        return array([minimum(data[:, [i]], other).sum(0)
+                      for i in range(data.shape[1])])
+    if data.size > maxProductSize:
+        return packedSharedBands(data, other)
+    return dot(data.T.astype('float64'), other.astype('float64'))
+
+def packedSharedBands(data, other):
+    # 8 clusters per byte; the bands in common are the set bits of the and
+    # of two columns
+    packed = packbits(data > 0, axis=0)
+    packedOther = packbits(other > 0, axis=0)
+    common = zeros([data.shape[1], other.shape[1]], dtype='int64')
+    for i in range(data.shape[1]):
+        common[i] = popCount[packed[:, [i]] & packedOther].sum(0)
+    return common
+
+def nearClusters(data, tolerance):
+    # bands spread over the clusters at most tolerance away
+    near = data.copy()
+    for k in range(1, min(tolerance, data.shape[0] - 1) + 1):
+        near[k:] = maximum(near[k:], data[:-k])
+        near[:-k] = maximum(near[:-k], data[k:])
+    return near
+
+class BandCounts(object):
+    # Co-occurrence tables of all pairs of samples (i, j), shared by the
+    # similarity coefficients: a - bands shared by both samples (the smaller
+    # count where a sample has more bands in a cluster), b - the other bands
+    # of i, c - the other bands of j, d - clusters with bands of neither.
+    # near - bands of i with a band of j at most tolerance clusters away and
+    # the other way around, is only computed when a coefficient asks for it.
     
-    nSamples = data.shape[1]
-#    print nSamples
+    def __init__(self, data, tolerance=clusterTolerance):
+        self.data = data
+        self.tolerance = tolerance
+        self.a = sharedBands(data)
+        numBands = data.sum(0)
+        self.b = numBands[:, newaxis] - self.a
+        self.c = numBands[newaxis, :] - self.a
+        self.d = sharedBands((data == 0).astype(data.dtype))
+        self.nearBands = None
     
-    numBands = data.sum(0)
-#    print 'Sum over line:', numBands
+    @property
+    def near(self):
+        if self.nearBands is None:
+            near = sharedBands(self.data,
+                               nearClusters(self.data, self.tolerance))
+            self.nearBands = minimum(near, near.T)
+        return self.nearBands
+
+def dice(counts):
+    # dice(i, j) = 2*n_ij/(n_i + n_j)
+    return 200.0 * counts.a / (2*counts.a + counts.b + counts.c)
+
+def jaccard(counts):
+    return 100.0 * counts.a / (counts.a + counts.b + counts.c)
+
+def simpleMatching(counts):
+    return 100.0 * (counts.a + counts.d) \
+                 / (counts.a + counts.b + counts.c + counts.d)
+
+def toleranceDice(counts):
+    # dice with the bands matched up to counts.tolerance clusters apart
+    return 200.0 * counts.near / (2*counts.a + counts.b + counts.c)
+
+# the band sharing F of Nei and Li (1979) is the Dice coefficient
+similarityCoefficients = {'Dice' : dice,
+                          'Jaccard' : jaccard,
+                          'Simple Matching' : simpleMatching,
+                          'Nei-Li' : dice,
+                          'Dice (Position Tolerance)' : toleranceDice,
+                         }
+
+def similarityMatrix(data, coefficient=dice, counts=None):
+    # the counts (BandCounts of data) can be shared by several coefficients
+    if counts == None:
+        counts = BandCounts(data)
     
-    simMatrix = 100 * eye(nSamples)
-    for i in range(nSamples):
-        for j in range(i+1, nSamples):
-            numBandsCommon = take(data, [i, j], 1).min(1).sum()
-            simMatrix[i, j] = simMatrix[j, i] = \
-                            200.0 * numBandsCommon / (numBands[i] + numBands[j])
+    # two samples without bands give 0/0, left as nan
+    with errstate(divide='ignore', invalid='ignore'):
+        simMatrix = coefficient(counts)
+    fill_diagonal(simMatrix, 100)
     return simMatrix
 
+def similarityMatrices(data, names):
+    # several coefficients (by name) from the same co-occurrence counts
+    counts = BandCounts(data)
+    return dict((name, similarityMatrix(data, similarityCoefficients[name],
+                                        counts))
+                for name in names)
+
 def distanceMatrix(simMatrix):
     return 100-simMatrix
 
+def firstPair(rows, cols, nodes):
+    # of the pairs (rows[k], cols[k]) the first in the order of their tree
+    # nodes, as when the matrix kept the nodes in that order, as (i, j) with
+    # nodes[i] < nodes[j]
+    if rows.size == 0: # nan distances, of samples without bands
+        return 0, 1
+    first = minimum(nodes[rows], nodes[cols])
+    second = maximum(nodes[rows], nodes[cols])
+    k = lexsort((second, first))[0]
+    i, j = rows[k], cols[k]
+    if nodes[i] > nodes[j]:
+        i, j = j, i
+    return i, j
+
+def pickJoin(S, R, N, nodes):
+    # the pair with the smallest Q[i, j] = (N-2)*S[i, j] - R[i], where S holds
+    # D[i, j] - R[j]/(N-2); values closer than tieTolerance are ties
+    rowMin = (N-2) * S.min(1) - R
+    qMin = rowMin.min()
+    limit = qMin + tieTolerance * max(1.0, abs(qMin))
+    rows = (rowMin <= limit).nonzero()[0]
+    rowTies, cols = ((N-2) * S[rows] - R[rows, newaxis] <= limit).nonzero()
+    return firstPair(rows[rowTies], cols, nodes)
+
 def neighbourJoining(distMatrix):
+    # The rows of D are the active nodes; the parent of a join takes the row
+    # of one child and the last active row moves to the row of the other, so
+    # the active part is always D[:N, :N]. R (the row sums) is updated with
+    # the change of the joined rows.
     N = distMatrix.shape[0]
-    D = distMatrix[:, :]
+    D = array(distMatrix, dtype='float64')
+    R = D.sum(1)
+    S = zeros([N, N])
+    nodes = arange(N)
     
-    tree = -ones([N, 1])
-    dist = zeros([N, 1])
-    indices = linspace(0, N-1, N)
+    tree = -ones(max(N, 2*N - 2))
+    dist = zeros(tree.size)
+    parent = N
     
     while N > 2:
-#        print '-----------------', N, '-----------------'
-#        print 'D='
-#        print D
-        
-        R = D.sum(0)
-#        print 'R='
-#        print R
-        
-        Q = (1+D.max()) * eye(N) # zeros([N, N]) #TODO: why does it work? safer:
-        for i in range(N):
-            for j in range(i+1, N):
-                Q[i, j] = Q[j, i] = (N-2) * D[i, j] - R[i] - R[j]
-        i, j = unravel_index(argmin(Q), Q.shape)
-        mi = indices[i]
-        mj = indices[j]
-        
-#        print 'Q='
-#        print Q
-#        print 'i,j=', (mi, mj), (i, j)
+        Sa = S[:N, :N]
+        subtract(D[:N, :N], R[:N] / (N-2), out=Sa)
+        fill_diagonal(Sa, inf)
+        i, j = pickJoin(Sa, R[:N], N, nodes[:N])
+        mi = nodes[i]
+        mj = nodes[j]
         
         # add parent to tree and change parent of leaf i and j
-        tree = append(tree, -1)
-        tree[mi] = tree[mj] = tree.size - 1
-#        print 'Tree:', tree
-    
+        tree[mi] = tree[mj] = parent
+        
         # compute distance to parent
-        dist = append(dist, 0)
-        dist[mi] = 0.5 * (D[i, j] + (R[i] - R[j])/(N-2) )
-        dist[mj] = D[i, j] - dist[mi]
-#        print 'Dist:', dist
+        dij = D[i, j]
+        dist[mi] = 0.5 * (dij + (R[i] - R[j])/(N-2) )
+        dist[mj] = dij - dist[mi]
         if dist[mi] < 0:
             dist[mj] -= dist[mi]
             dist[mi] = 0
@@ -91,52 +203,197 @@ def neighbourJoining(distMatrix):
             dist[mi] -= dist[mj]
             dist[mj] = 0
         
-        # recompute indices
-        indices = delete(indices, [i, j])
-        indices = append(indices, tree.size-1)
-#        print 'Idxs:', indices
+        # distances from the parent to the other nodes (0 to i and j)
+        D_p = 0.5*(D[i, :N] + D[j, :N] - dij)
+        R[:N] += D_p - D[i, :N] - D[j, :N]
+        R[i] = D_p.sum()
+        D[i, :N] = D_p
+        D[:N, i] = D_p
+        nodes[i] = parent
+        
+        # the last active row fills row j
+        last = N - 1
+        if j != last:
+            D[j, :N] = D[last, :N]
+            D[:N, j] = D[:N, last]
+            R[j] = R[last]
+            nodes[j] = nodes[last]
+        
+        parent += 1
+        N -= 1
+    
+    if N == 2:
+        dist[nodes[0]] = dist[nodes[1]] = 0.5 * D[0, 1]
+    
+    return tree, dist
+
+def sortRows(D, rows, nodes, SD, SI, start, length):
+    # the distances of each row to the other rows, sorted, and their nodes
+    sub = D[rows[:, newaxis], rows]
+    fill_diagonal(sub, inf)
+    order = sub.argsort(1, kind='mergesort')[:, :-1]
+    m = rows.size - 1
+    SD[rows, :m] = sub[arange(rows.size)[:, newaxis], order]
+    SI[rows, :m] = nodes[rows][order]
+    start[rows] = 0
+    length[rows] = m
+
+def joinCandidates(rows, bound, n, R, SD, SI, start, length, alive, slots):
+    # pairs (row, slot, Q) with Q <= bound; the sorted distances of each row
+    # are read up to (bound + R[row] + max(R))/(n-2), beyond it the Q of the
+    # row can not get under bound (SD and SI are read as flat arrays)
+    uMax = R[rows].max()
+    limit = (bound + R[rows] + uMax) / (n-2)
+    base = rows * SD.shape[1]
+    SD, SI = SD.reshape(-1), SI.reshape(-1)
+    lo, hi = start[rows].copy(), length[rows].copy()
+    
+    # most rows start over the limit, the others are searched by bisection
+    search = (lo < hi).nonzero()[0]
+    search = search[SD[base[search] + lo[search]] <= limit[search]]
+    lo[search] += 1
+    search = search[lo[search] < hi[search]]
+    while search.size > 0:
+        mid = (lo[search] + hi[search]) // 2
+        below = SD[base[search] + mid] <= limit[search]
+        lo[search[below]] = mid[below] + 1
+        hi[search[~below]] = mid[~below]
+        search = search[lo[search] < hi[search]]
+    
+    counts = lo - start[rows]
+    first = repeat(counts.cumsum() - counts, counts)
+    candRows = repeat(rows, counts)
+    candPos = arange(counts.sum()) - first + repeat(base + start[rows], counts)
+    candNodes = SI[candPos]
+    valid = alive[candNodes]
+    candRows, candPos = candRows[valid], candPos[valid]
+    candSlots = slots[candNodes[valid]]
+    Q = (n-2) * (SD[candPos] - R[candSlots] / (n-2)) - R[candRows]
+    return candRows, candSlots, Q
+
+def fastNeighbourJoining(distMatrix, check=False):
+    # Neighbour joining with the search for the smallest Q of RapidNJ
+    # (Simonsen, Mailund and Pedersen, 2008): each row keeps its distances
+    # sorted, which bound its Q values, so only the start of the rows is read.
+    # The rows of joined nodes are dropped and the parent gets a new sorted
+    # row, which holds the pairs with nodes older than it; the entries of
+    # removed nodes are skipped and cleared when half of the rows are gone.
+    # Joins and ties are those of neighbourJoining, with check the exact
+    # tree is built too and has to agree. Samples without bands give nan
+    # distances, which spread to every row sum with the first join and leave
+    # no candidates, those matrices are joined by neighbourJoining.
+    N = distMatrix.shape[0]
+    if N < 4 or not isfinite(distMatrix).all():
+        return neighbourJoining(distMatrix)
+    D = array(distMatrix, dtype='float64')
+    R = D.sum(1)
+    
+    tree = -ones(2*N - 2)
+    dist = zeros(tree.size)
+    parent = N
+    
+    nodes = arange(N) # node of each row
+    active = ones(N, dtype=bool)
+    slots = arange(tree.size) # row of each node
+    alive = zeros(tree.size, dtype=bool)
+    alive[:N] = True
+    
+    SD = zeros([N, N])
+    SI = zeros([N, N], dtype='int32')
+    start = zeros(N, dtype=int)
+    length = zeros(N, dtype=int)
+    sortRows(D, arange(N), nodes, SD, SI, start, length)
+    sortedAt = N
+    
+    n = N
+    while n > 2:
+        rows = active.nonzero()[0]
+        if 2 * n <= sortedAt:
+            sortRows(D, rows, nodes, SD, SI, start, length)
+            sortedAt = n
+        
+        # skip the removed nodes at the start of the rows
+        heads = rows
+        while heads.size > 0:
+            heads = heads[start[heads] < length[heads]]
+            heads = heads[~alive[SI[heads, start[heads]]]]
+            start[heads] += 1
         
-        # TODO: comment
-        D_p = zeros([N-2, 1])
-        idx = 0
-        for k in range(N):
-            if k!=i and k!=j:
-                D_p[idx] = 0.5*(D[i, k] + D[j, k] - D[i, j])
-                idx += 1
-#        print 'D_p:', transpose(D_p)
+        # the first pair of each row gives a bound for the smallest Q
+        heads = rows[start[rows] < length[rows]]
+        columns = slots[SI[heads, start[heads]]]
+        Q = (n-2) * (SD[heads, start[heads]] - R[columns] / (n-2)) - R[heads]
+        bound = Q.min()
+        bound += 2 * tieTolerance * max(1.0, abs(bound))
+        candRows, candSlots, Q = joinCandidates(rows, bound, n, R, SD, SI,
+                                                start, length, alive, slots)
+        qMin = Q.min()
+        limit = qMin + tieTolerance * max(1.0, abs(qMin))
+        if limit > bound:
+            candRows, candSlots, Q = joinCandidates(rows, limit, n, R, SD,
+                                                    SI, start, length, alive,
+                                                    slots)
+        tied = Q <= limit
+        i, j = firstPair(candRows[tied], candSlots[tied], nodes)
+        mi = nodes[i]
+        mj = nodes[j]
         
-#        print 'D - before:'
-#        print D
-        # compute distances from common parent to the other nodes
-        D = delete(D, [i, j], 0)
-        D = delete(D, [i, j], 1)
+        # add parent to tree and change parent of leaf i and j
+        tree[mi] = tree[mj] = parent
         
-#        print 'D - after delete:'
-#        print D
+        # compute distance to parent
+        dij = D[i, j]
+        dist[mi] = 0.5 * (dij + (R[i] - R[j])/(n-2) )
+        dist[mj] = dij - dist[mi]
+        if dist[mi] < 0:
+            dist[mj] -= dist[mi]
+            dist[mi] = 0
+        if dist[mj] < 0:
+            dist[mi] -= dist[mj]
+            dist[mj] = 0
         
-        # append new distances
-        D = append(D, D_p, 1)
-        D = append(D, append(transpose(D_p), 0).reshape(1, N-1), 0)
+        # distances from the parent to the other nodes, in row i
+        D_p = 0.5*(D[i, rows] + D[j, rows] - dij)
+        R[rows] += D_p - D[i, rows] - D[j, rows]
+        R[i] = D_p.sum()
+        D[i, rows] = D_p
+        D[rows, i] = D_p
         
-#        print 'D - after append:'
-#        print D
+        alive[mi] = alive[mj] = False
+        alive[parent] = True
+        nodes[i] = parent
+        slots[parent] = i
+        active[j] = False
         
-        N -= 1
-#        print '-------------------------------------'
-    
-    dist[indices[0]] = dist[indices[1]] = 0.5 * D[0, 1]
+        others = (rows != i) & (rows != j)
+        order = D_p[others].argsort(kind='mergesort')
+        SD[i, :order.size] = D_p[others][order]
+        SI[i, :order.size] = nodes[rows[others]][order]
+        start[i] = 0
+        length[i] = order.size
+        
+        parent += 1
+        n -= 1
     
-#    print '----------------FINAL----------------'
-#    print 'Tree', tree
-#    print 'Dist', dist
+    rows = active.nonzero()[0]
+    dist[nodes[rows[0]]] = dist[nodes[rows[1]]] = 0.5 * D[rows[0], rows[1]]
     
+    if check:
+        exactTree, exactDist = neighbourJoining(distMatrix)
+        if (exactTree != tree).any() \
+           or not allclose(exactDist, dist, rtol=1e-9, atol=1e-9):
+            raise ValueError('Fast neighbour joining differs from the exact '
+                             'tree!')
     return tree, dist
 
+# Lance-Williams updates: the distances of the other nodes k to the join of
+# i and j; dik, djk and nk are arrays over the nodes k
+
 def singleLinkage(dik, djk, dij, ni, nj, nk):
-    return min(dik, djk)
+    return minimum(dik, djk)
 
 def completeLinkage(dik, djk, dij, ni, nj, nk):
-    return max(dik, djk)
+    return maximum(dik, djk)
 
 def upgma(dik, djk, dij, ni, nj, nk):
     return (dik * ni + djk * nj)/(ni + nj)
@@ -154,113 +411,125 @@ def median(dik, djk, dij, ni, nj, nk):
 def ward(dik, djk, dij, ni, nj, nk):
     return (dik * (ni + nk) + djk * (nj + nk) - dij * nk) / (ni + nj + nk)
 
+def pickPair(D, nodes):
+    # the pair with the smallest distance
+    rowMin = D.min(1)
+    rows = (rowMin == rowMin.min()).nonzero()[0]
+    rowTies, cols = (D[rows] == rowMin.min()).nonzero()
+    return firstPair(rows[rowTies], cols, nodes)
+
 def computePhylTree(distMatrix, method):
+    # The rows of D are the active nodes, as in neighbourJoining: the join
+    # takes the row of one child and the last active row moves to the row of
+    # the other. method updates the row of the join in one call. A node is
+    # height (half the distance of its join) over the leaves, the branch to
+    # its parent is the height of the parent less its own.
     N = distMatrix.shape[0]
-    D = distMatrix[:, :]
+    D = array(distMatrix, dtype='float64')
+    fill_diagonal(D, inf)
+    nodes = arange(N)
     
-    tree = -ones([N, 1])
-    dist = zeros([N, 1])
-    distAbsl = zeros([N, 1])
-    samples = ones([N, 1])
-    indices = linspace(0, N-1, N)
+    tree = -ones(max(N, 2*N - 2))
+    dist = zeros(tree.size)
+    height = zeros(tree.size)
+    samples = ones(tree.size)
+    parent = N
     
     while N > 2:
-#        print '-----------------', N, '-----------------'
-        maxVal = 1 + D.max()
-        D = D + eye(N) * (maxVal - D[0, 0])
-#        print 'D='
-#        print D
-
-        i, j = unravel_index(argmin(D), D.shape)
-        mi = indices[i]
-        mj = indices[j]
-#        print 'i,j=', (mi, mj), (i, j)
+        i, j = pickPair(D[:N, :N], nodes[:N])
+        mi = nodes[i]
+        mj = nodes[j]
         
         # add parent to tree and change parent of leaf i and j
-        tree = append(tree, -1)
-        tree[mi] = tree[mj] = tree.size - 1
-#        print 'Tree:', tree
-
-        # compute absolute distance
-        distAbsl = append(distAbsl, 0)    
-        distAbsl[mi] = distAbsl[mj] = D[i, j]/2
-#        print 'Dist absl:', distAbsl
+        tree[mi] = tree[mj] = parent
         
         # compute distance to parent
-        dist = append(dist, 0)
-        if argwhere(tree == mi).size > 0:
-            dist[mi] = distAbsl[mi] - distAbsl[argwhere(tree == mi)[0]]
-        else:
-            dist[mi] = distAbsl[mi]
-        if argwhere(tree == mj).size > 0:
-            dist[mj] = distAbsl[mj] - distAbsl[argwhere(tree == mj)[0]]
-        else:
-            dist[mj] = distAbsl[mj]
-#        print 'Dist:', dist
+        dij = D[i, j]
+        height[parent] = dij/2
+        dist[mi] = dij/2 - height[mi]
+        dist[mj] = dij/2 - height[mj]
         
         # compute number of samples
-        samples = append(samples, samples[mi] + samples[mj])
-        
-        # TODO: comment
-        D_p = zeros([N-2, 1])
-        idx = 0
-        for k in range(N):
-            if k!=i and k!=j:
-                D_p[idx] = method(D[i, k], D[j, k], D[i, j], \
-                                  samples[mi], samples[mj], samples[indices[k]])
-                idx += 1
-#        print 'D_p:', transpose(D_p)
-        
-        # recompute indices
-        indices = delete(indices, [i, j])
-        indices = append(indices, tree.size-1)
-#        print 'Idxs:', indices
-        
-#        print 'D - before:'
-#        print D
-        # compute distances from common parent to the other nodes
-        D = delete(D, [i, j], 0)
-        D = delete(D, [i, j], 1)
+        samples[parent] = samples[mi] + samples[mj]
         
-#        print 'D - after delete:'
-#        print D
+        # distances from the parent to the other nodes, in row i
+        others = arange(N)
+        others = others[(others != i) & (others != j)]
+        D_p = method(D[i, others], D[j, others], dij, samples[mi],
+                     samples[mj], samples[nodes[others]])
+        D[i, others] = D_p
+        D[others, i] = D_p
+        nodes[i] = parent
         
-        # append new distances
-        D = append(D, D_p, 1)
-        D = append(D, append(transpose(D_p), maxVal).reshape(1, N-1), 0)
-        
-#        print 'D - after append:'
-#        print D
+        # the last active row fills row j
+        last = N - 1
+        if j != last:
+            D[j, :N] = D[last, :N]
+            D[:N, j] = D[:N, last]
+            nodes[j] = nodes[last]
         
+        parent += 1
         N -= 1
-#        print '-------------------------------------'
-    
-    mi = indices[0]
-    mj = indices[1]
-    # compute absolute distance
-    distAbsl[mi] = distAbsl[mj] = D[0, 1]/2
-    
-    # compute distance to parent
-    if argwhere(tree == mi).size > 0:
-        dist[mi] = distAbsl[mi] - distAbsl[argwhere(tree == mi)[0]]
-    else:
-        dist[mi] = distAbsl[mi]
-    if argwhere(tree == mj).size > 0:
-        dist[mj] = distAbsl[mj] - distAbsl[argwhere(tree == mj)[0]]
-    else:
-        dist[mj] = distAbsl[mj]
     
-#    print '----------------FINAL----------------'
-#    print 'Tree', tree
-#    print 'Dist', dist
+    if N == 2:
+        dist[nodes[0]] = D[0, 1]/2 - height[nodes[0]]
+        dist[nodes[1]] = D[0, 1]/2 - height[nodes[1]]
     
     return tree, dist
 
-def computePhylogeneticTree(distMatrix, method):
+treeMethods = {'Neighbour Joining' : neighbourJoining,
+               'Neighbour Joining (Fast)' : fastNeighbourJoining,
+               'Single Linkage' : singleLinkage,
+               'Complete Linkage' : completeLinkage,
+               'UPGMA' : upgma,
+               'WPGMA' : wpgma,
+#               'Centroid' : centroid, #TODO: negative branch distance
+#               'Median' : median, #TODO: negative branch distance
+#               'Ward' : ward #TODO: negative branch distance
+              }
+
+def computePhylogeneticTree(distMatrix, method, check=False):
+    # check - the fast neighbour joining is compared with the exact one
     if method == neighbourJoining:
         return neighbourJoining(distMatrix)
+    if method == fastNeighbourJoining:
+        return fastNeighbourJoining(distMatrix, check)
     return computePhylTree(distMatrix, method)
 
+def newickLabel(name):
+    name = str(name)
+    if any(c in name for c in "()[]':;,"):
+        return "'" + name.replace("'", "''") + "'"
+    return name.replace(' ', '_')
+
+def newickTree(tree, dist, names):
+    tree = array(tree).ravel()
+    dist = array(dist).ravel()
+    
+    children = dict((node, []) for node in range(-1, tree.size))
+    for node, parent in enumerate(tree):
+        children[int(parent)].append(node)
+    
+    # post-order walk with an explicit stack, trees can be deep
+    parts = {}
+    stack = [(-1, False)]
+    while stack:
+        current, visited = stack.pop()
+        if not visited and children[current]:
+            stack.append((current, True))
+            stack.extend((child, False) for child in reversed(children[current]))
+            continue
+        
+        if children[current]:
+            label = '(' + ','.join(map(parts.pop, children[current])) + ')'
+        else:
+            label = newickLabel(names[current])
+        if current >= 0:
+            label += ':%.4f' % dist[current]
+        parts[current] = label
+    
+    return parts[-1] + ';'
+
 def longestPath(tree, dist, current):
     new = argwhere(tree == current)
     if new.size == 0:
@@ -326,7 +595,7 @@ def showTree(tree, dist, N):
         newNode = int(tree[newNode])
     
     for idx in range(2*N-1):
-        print '#' + ''.join(strList[idx])
+        print('#' + ''.join(strList[idx]))
         
 def showTreeRevised(tree, dist, N):
     node, length = longestPath(tree, dist, -1)
@@ -335,7 +604,7 @@ def showTreeRevised(tree, dist, N):
     buildPathsForward(tree, dist, -1, strList, 0, 0)
     
     for idx in range(2*N-1):
-        print '#' + ''.join(strList[idx])
+        print('#' + ''.join(strList[idx]))
 
 #TODO: add tree visualization procedure using matplotlib 
 
@@ -0,0 +1,346 @@
+'''
+    PyElph - Headless batch processing of gel images
+    Copyright (C) 2012  Ana Brandusa Pavel <anabrandusa@gmail.com>,
+                        Cristian Ioan Vasile <cristian.ioan.vasile@gmail.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+from __future__ import with_statement
+import getopt
+import glob
+import os
+import sys
+import time
+from multiprocessing import cpu_count
+
+try:
+    import ConfigParser as configparser
+except ImportError:
+    import configparser
+
+#numpy
+from numpy import asarray, loadtxt, savetxt
+
+#Gel Analysis
+from analysis.BackgroundSubstraction import backgroundSubstraction
+from analysis.GelImage import openGelImage
+from analysis.Lane import extractLanes, smoothingMethods
+from analysis.Parallel import lanePool
+from analysis.Bands import extractBands, bandMatching, computeMatchMatrix, \
+    extractWeightsModel, computeWeights
+from analysis.PhylTree import distanceMatrix, similarityMatrix, \
+    computePhylogeneticTree, newickTree, treeMethods, similarityCoefficients
+
+from batch.Scheduler import scheduleImages
+
+
+imageExtensions = ('.gif', '.png', '.jpg', '.jpeg', '.tif', '.tiff', '.bmp')
+
+# same defaults as the option pages of the GUI
+defaultConfig = {
+    'lanes' :    {'width deviation' : '25', 'lane width' : 'auto'},
+    'bands' :    {'threshold' : '20', 'filter width' : '3',
+                  'filter passes' : '10', 'smoothing' : 'Iterative'},
+    'weights' :  {'markers' : '', 'marker' : '', 'standard' : ''},
+    'matching' : {'distance' : '2.0'},
+    'tree' :     {'method' : 'Neighbour Joining', 'similarity' : 'Dice',
+                  'check' : 'no'},
+}
+
+
+def usage(msg=''):
+    if msg:
+        sys.stderr.write(msg + '\n')
+    sys.stderr.write('''Usage: %s batch [options] image|directory|glob ...
+options:
+  -h | --help            - print help message
+  -c | --config file     - parameters file
+  -o | --output dir      - output directory (default: next to each image)
+  -j | --jobs n          - number of worker processes (default: all CPUs)
+  -r | --report file     - JSON lines progress report (default: stdout)
+  --max-in-flight n      - images queued at once (default: twice the jobs)
+  -l | --lane-jobs n     - processes sharing the lanes of an image when the
+                           images are processed one at a time (default: all
+                           CPUs, 0 processes the lanes in order)
+
+The parameters file has the following sections and keys (defaults shown):
+  [lanes]     width deviation = 25, lane width = auto
+  [bands]     threshold = 20, filter width = 3, filter passes = 10,
+              smoothing = %s
+  [weights]   markers = (marker lanes, e.g. 1, 12), marker = (lane used for
+              the weight model, default the first marker),
+              standard = (name from the standards folder or .marker file)
+  [matching]  distance = 2.0
+  [tree]      method = %s,
+              similarity = %s,
+              check = no (yes builds the exact tree too and fails the image
+              when the fast neighbour joining differs from it)
+''' % (sys.argv[0], ' | '.join(sorted(smoothingMethods.keys())),
+       ' | '.join(sorted(treeMethods.keys())),
+       ' | '.join(sorted(similarityCoefficients.keys()))))
+
+
+def readParameters(filename=None):
+    config = configparser.RawConfigParser()
+    for section, options in defaultConfig.items():
+        config.add_section(section)
+        for option, value in options.items():
+            config.set(section, option, value)
+    if filename != None and not config.read(filename):
+        raise IOError('Can not read parameters file %s!' % filename)
+
+    params = {}
+
+    # Detect Lanes Page
+    params['maxDev'] = config.getfloat('lanes', 'width deviation') / 100.0
+    width = config.get('lanes', 'lane width').strip()
+    params['laneWidth'] = None
+    if width.lower() != 'auto':
+        params['laneWidth'] = float(width)
+
+    # Detect Bands Page
+    params['filterThreshold'] = config.getint('bands', 'threshold')
+    params['filterWidth'] = config.getint('bands', 'filter width')
+    params['filterPasses'] = config.getint('bands', 'filter passes')
+    params['smoothing'] = config.get('bands', 'smoothing').strip()
+    if params['smoothing'] not in smoothingMethods:
+        raise ValueError('Unknown smoothing %s!' % params['smoothing'])
+
+    # Band Weight Page
+    markers = config.get('weights', 'markers').replace(',', ' ').split()
+    params['markerLanes'] = [int(k) - 1 for k in markers]
+    marker = config.get('weights', 'marker').strip()
+    params['marker'] = -1
+    if marker:
+        params['marker'] = int(marker) - 1
+    elif params['markerLanes']:
+        params['marker'] = params['markerLanes'][0]
+    params['standard'] = None
+    standard = config.get('weights', 'standard').strip()
+    if standard:
+        params['standard'] = loadWeightStandard(standard)
+
+    # Match Bands Page
+    params['distance'] = config.getfloat('matching', 'distance')
+
+    # Phylogenetic Tree Page
+    params['method'] = config.get('tree', 'method').strip()
+    if params['method'] not in treeMethods:
+        raise ValueError('Unknown tree method %s!' % params['method'])
+    params['similarity'] = config.get('tree', 'similarity').strip()
+    if params['similarity'] not in similarityCoefficients:
+        raise ValueError('Unknown similarity coefficient %s!'
+                         % params['similarity'])
+    params['check'] = config.getboolean('tree', 'check')
+
+    return params
+
+def loadWeightStandard(standard):
+    stdPath = standard
+    if not os.path.exists(stdPath):
+        stdPath = os.path.join(os.getcwd(), 'standards', standard + '.marker')
+    if not os.path.exists(stdPath):
+        raise IOError('Can not find weight standard %s!' % standard)
+    return loadtxt(stdPath, dtype='uint32')
+
+def findImages(paths):
+    images = []
+    for path in paths:
+        if os.path.isdir(path):
+            found = [os.path.join(path, filename)
+                     for filename in os.listdir(path)
+                     if os.path.splitext(filename)[1].lower() in imageExtensions]
+        else:
+            found = glob.glob(path)
+        images.extend(sorted(found))
+    return images
+
+def loadImage(filename):
+    return asarray(openGelImage(filename))
+
+#-------------------------------------------------------------------------------
+
+def analyzeGel(data, params, timings=None, executor=None):
+    # timings (optional dict) receives the duration of each stage in seconds,
+    # executor (optional pool) spreads the band extraction over the lanes
+    if timings == None:
+        timings = {}
+    results = {}
+    start = time.time()
+
+    # Detect Lanes Page
+    lanes, laneWidth = extractLanes(data, params['maxDev'],
+                                    meanLaneWidth=params['laneWidth'])
+    if len(lanes) == 0:
+        raise ValueError('No lanes were detected!')
+    results['lanes'] = lanes
+    results['laneWidth'] = laneWidth
+    start = stageTime(timings, 'lanes', start)
+
+    back = backgroundSubstraction(data, lanes)
+    start = stageTime(timings, 'background', start)
+
+    # Detect Bands Page
+    bands = extractBands(back, lanes, params['filterThreshold'],
+                         params['filterWidth'], params['filterPasses'],
+                         smoothingMethods[params['smoothing']], executor)
+    empty = [k+1 for k, b in enumerate(bands) if len(b) == 0]
+    if empty:
+        raise ValueError('Lanes %s are empty!' % empty)
+    results['bands'] = bands
+    start = stageTime(timings, 'bands', start)
+
+    # Band Weight Page
+    results['weights'] = None
+    std = params['standard']
+    marker = params['marker']
+    if std is not None and 0 <= marker < len(bands):
+        if len(bands[marker]) != len(std):
+            raise ValueError('Standard can not be applied to marker lane %d '
+                             '(%d bands, %d weights)!'
+                             % (marker+1, len(bands[marker]), len(std)))
+        model = extractWeightsModel(bands, std, marker)
+        results['weights'] = computeWeights(bands, model)
+        start = stageTime(timings, 'weights', start)
+
+    # Match Bands Page
+    markerLanes = params['markerLanes']
+    matchBands = bands.dropLanes(markerLanes)
+    results['laneNames'] = ['Lane %d' % (k+1) for k in range(len(bands))
+                            if k not in markerLanes]
+    distance = int(params['distance'] * data.shape[0] / 100)
+    clusters = bandMatching(matchBands, distance)
+    matrix = computeMatchMatrix(matchBands, len(clusters))
+    results['clusters'] = clusters
+    results['matrix'] = matrix
+    start = stageTime(timings, 'matching', start)
+
+    # Phylogenetic Tree Page
+    simMatrix = similarityMatrix(matrix,
+                                 similarityCoefficients[params['similarity']])
+    distMatrix = distanceMatrix(simMatrix)
+    tree, dist = computePhylogeneticTree(distMatrix,
+                                         treeMethods[params['method']],
+                                         params['check'])
+    results['simMatrix'] = simMatrix
+    results['tree'] = newickTree(tree, dist, results['laneNames'])
+    stageTime(timings, 'tree', start)
+
+    return results
+
+def writeResults(results, prefix):
+    savetxt(prefix + '_matrix.txt', results['matrix'], '%d')
+    savetxt(prefix + '_similarity.txt', results['simMatrix'], '%.2f')
+    if results['weights'] is not None:
+        with open(prefix + '_weights.txt', 'w') as f:
+            for line in results['weights']:
+                f.write(' '.join(map(str, line)) + '\n')
+    with open(prefix + '_tree.nwk', 'w') as f:
+        f.write(results['tree'] + '\n')
+
+def stageTime(timings, stage, start):
+    now = time.time()
+    timings[stage] = now - start
+    return now
+
+def outputPrefix(filename, outputDir=None):
+    name = os.path.splitext(filename)[0]
+    if outputDir != None:
+        name = os.path.join(outputDir, os.path.basename(name))
+    return name
+
+def processImage(filename, params, outputDir=None, executor=None,
+                 timings=None):
+    if timings == None:
+        timings = {}
+    start = time.time()
+    data = loadImage(filename)
+    stageTime(timings, 'load', start)
+    results = analyzeGel(data, params, timings, executor)
+    start = time.time()
+    writeResults(results, outputPrefix(filename, outputDir))
+    stageTime(timings, 'write', start)
+    return results
+
+#-------------------------------------------------------------------------------
+
+def runBatch(argv):
+    try:
+        opts, args = getopt.getopt(argv, 'hc:o:j:r:l:',
+                                   ['help', 'config=', 'output=', 'jobs=',
+                                    'report=', 'max-in-flight=',
+                                    'lane-jobs='])
+    except getopt.GetoptError:
+        usage(str(sys.exc_info()[1]))
+        return 2
+
+    configFile = None
+    outputDir = None
+    processes = None
+    maxInFlight = None
+    reportFile = None
+    laneJobs = None
+    for o, a in opts:
+        if o in ('-h', '--help'):
+            usage()
+            return 0
+        elif o in ('-c', '--config'):
+            configFile = a
+        elif o in ('-o', '--output'):
+            outputDir = a
+        elif o in ('-j', '--jobs'):
+            processes = int(a)
+        elif o in ('-r', '--report'):
+            reportFile = a
+        elif o == '--max-in-flight':
+            maxInFlight = int(a)
+        elif o in ('-l', '--lane-jobs'):
+            laneJobs = int(a)
+
+    images = findImages(args)
+    if len(images) == 0:
+        usage('No images specified!')
+        return 2
+
+    params = readParameters(configFile)
+    if outputDir != None and not os.path.exists(outputDir):
+        os.makedirs(outputDir)
+
+    # a single image runs in this process, with its lanes spread over a
+    # pool instead; image workers do not get lane pools of their own
+    if processes == None or processes < 1:
+        processes = cpu_count()
+    processes = min(processes, len(images))
+    executor = None
+    if processes == 1 and laneJobs != 0:
+        executor = lanePool(laneJobs)
+
+    report = sys.stdout
+    if reportFile != None:
+        report = open(reportFile, 'w')
+    try:
+        failed = scheduleImages(processImage, images,
+                                (params, outputDir, executor),
+                                processes, maxInFlight, report)
+    finally:
+        if report is not sys.stdout:
+            report.close()
+        if hasattr(executor, 'shutdown'):
+            executor.shutdown()
+        elif executor != None:
+            executor.close()
+            executor.join()
+
+    return int(len(failed) > 0)
@@ -0,0 +1,136 @@
+'''
+    PyElph - Multiprocess scheduler for batch processing
+    Copyright (C) 2012  Ana Brandusa Pavel <anabrandusa@gmail.com>,
+                        Cristian Ioan Vasile <cristian.ioan.vasile@gmail.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+import json
+import sys
+import time
+from multiprocessing import cpu_count
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+from analysis.Parallel import lanePool
+
+
+def runTask(task):
+    # executed in the worker processes, the image is loaded and the results
+    # are written by the worker, only the timings travel back
+    worker, filename, args = task
+    timings = {}
+    start = time.time()
+    try:
+        worker(filename, *args, **{'timings' : timings})
+    except Exception:
+        error = sys.exc_info()[1]
+        return filename, timings, time.time() - start, \
+               '%s: %s' % (error.__class__.__name__, error)
+    return filename, timings, time.time() - start, None
+
+def reportEvent(report, event, **fields):
+    if report == None:
+        return
+    fields['event'] = event
+    fields['time'] = round(time.time(), 3)
+    report.write(json.dumps(fields, sort_keys=True) + '\n')
+    report.flush()
+
+def submitTask(executor, task, done):
+    # puts the result of the task in the done queue when it is finished
+    if hasattr(executor, 'submit'): # concurrent.futures executor
+        future = executor.submit(runTask, task)
+        def callback(future):
+            try:
+                done.put(future.result())
+            except Exception: # the worker process died
+                done.put((task[1], {}, 0.0, str(sys.exc_info()[1])))
+        future.add_done_callback(callback)
+    else: # multiprocessing pool
+        def errback(error):
+            done.put((task[1], {}, 0.0, str(error)))
+        try:
+            executor.apply_async(runTask, (task,), callback=done.put,
+                                 error_callback=errback)
+        except TypeError: # Python 2 pools have no error callback
+            executor.apply_async(runTask, (task,), callback=done.put)
+
+def scheduleImages(worker, images, args=(), processes=None, maxInFlight=None,
+                   report=sys.stdout):
+    # calls worker(filename, *args, timings={}) for every image in a pool of
+    # processes, with at most maxInFlight images submitted at any time, and
+    # writes the progress as JSON lines to report; returns the failed images
+    if processes == None or processes < 1:
+        processes = cpu_count()
+    if maxInFlight == None or maxInFlight < 1:
+        maxInFlight = 2 * processes
+    total = len(images)
+    reportEvent(report, 'start', images=total, processes=processes,
+                maxInFlight=maxInFlight)
+
+    start = time.time()
+    stageTotals = {}
+    failed = []
+    finished = 0
+
+    def collect(result):
+        filename, timings, seconds, error = result
+        for stage, t in timings.items():
+            stageTotals[stage] = stageTotals.get(stage, 0.0) + t
+        if error == None:
+            reportEvent(report, 'done', image=filename, seconds=seconds,
+                        stages=timings, finished=finished, total=total)
+        else:
+            failed.append(filename)
+            reportEvent(report, 'failed', image=filename, seconds=seconds,
+                        error=error, finished=finished, total=total)
+
+    if processes == 1: # no pool, everything in this process
+        for filename in images:
+            result = runTask((worker, filename, args))
+            finished += 1
+            collect(result)
+    else:
+        executor = lanePool(processes)
+        done = queue.Queue()
+        pending = iter(images)
+        inFlight = 0
+        try:
+            while True:
+                for filename in pending:
+                    submitTask(executor, (worker, filename, args), done)
+                    inFlight += 1
+                    if inFlight >= maxInFlight:
+                        break
+                if inFlight == 0:
+                    break
+                result = done.get()
+                inFlight -= 1
+                finished += 1
+                collect(result)
+        finally:
+            if hasattr(executor, 'shutdown'):
+                executor.shutdown()
+            else:
+                executor.close()
+                executor.join()
+
+    reportEvent(report, 'finish', images=total, failed=len(failed),
+                seconds=time.time() - start, stages=stageTotals)
+    return failed
@@ -0,0 +1,216 @@
+'''
+    PyElph - Benchmarks of the analysis stages on synthetic gels
+    Copyright (C) 2012  Ana Brandusa Pavel <anabrandusa@gmail.com>,
+                        Cristian Ioan Vasile <cristian.ioan.vasile@gmail.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+
+from __future__ import print_function
+import getopt
+import json
+import platform
+import sys
+
+#Gel Analysis
+from analysis.BackgroundSubstraction import backgroundSubstraction
+from analysis.Lane import extractLanes
+from analysis.Bands import extractBands, bandMatching, computeMatchMatrix
+from analysis.PhylTree import distanceMatrix, similarityMatrix, \
+    neighbourJoining, fastNeighbourJoining, computePhylTree, upgma
+
+from benchmarks.Golden import markerLanes, matchDistance, timed
+from benchmarks.SyntheticGel import syntheticGel
+
+
+# each scenario changes one parameter of the base gel, the last ones size
+# the batch runs on large scans
+baseGel = {'seed' : 0, 'noLanes' : 12, 'laneWidth' : 20, 'noBands' : 8,
+           'noise' : 8, 'smile' : 0, 'height' : 400}
+scenarios = [
+    ('base', {}),
+    ('lanes-40', {'noLanes' : 40}),
+    ('lanes-100', {'noLanes' : 100}),
+    ('wide-lanes', {'laneWidth' : 60}),
+    ('dense-bands', {'noBands' : 30}),
+    ('noisy', {'noise' : 24}),
+    ('smile', {'smile' : 12}),
+    ('tall', {'height' : 2000}),
+    ('large', {'noLanes' : 60, 'laneWidth' : 40, 'noBands' : 20,
+               'height' : 1500}),
+]
+
+stages = ['extractLanes', 'backgroundSubstraction', 'extractBands',
+          'bandMatching', 'similarityMatrix', 'neighbourJoining',
+          'fastNeighbourJoining', 'computePhylTree']
+
+slowdownRatio = 1.25 # current/baseline time above which a stage is reported
+
+
+def usage(msg=''):
+    if msg:
+        sys.stderr.write(msg + '\n')
+    sys.stderr.write('''Usage: python -m benchmarks.Benchmark [options] [scenario ...]
+options:
+  -h | --help            - print help message
+  -o | --output file     - write the results as JSON
+  -c | --compare file    - compare with the results of an earlier run
+  -r | --repeat n        - runs per stage, the fastest is kept (default: 3)
+  -t | --threshold x     - slowdown ratio reported by --compare (default: %.2f)
+scenarios: %s (default: all)
+''' % (slowdownRatio, ', '.join(name for name, changes in scenarios)))
+
+def gelParameters(changes):
+    params = dict(baseGel)
+    params.update(changes)
+    return params
+
+def runScenario(params, repeat):
+    # best time of every stage and the sizes it worked on
+    timings = {}
+    data = syntheticGel(**params)
+    
+    lanes, laneWidth = timed(timings, 'extractLanes', repeat,
+                             extractLanes, data)
+    back = timed(timings, 'backgroundSubstraction', repeat,
+                 backgroundSubstraction, data, lanes)
+    bands = timed(timings, 'extractBands', repeat, extractBands, back, lanes)
+    
+    matchBands = bands.dropLanes(markerLanes)
+    distance = int(matchDistance * data.shape[0] / 100)
+    clusters = timed(timings, 'bandMatching', repeat,
+                     bandMatching, matchBands, distance)
+    matrix = computeMatchMatrix(matchBands, len(clusters))
+    
+    simMatrix = timed(timings, 'similarityMatrix', repeat,
+                      similarityMatrix, matrix)
+    distMatrix = distanceMatrix(simMatrix)
+    timed(timings, 'neighbourJoining', repeat, neighbourJoining, distMatrix)
+    timed(timings, 'fastNeighbourJoining', repeat,
+          fastNeighbourJoining, distMatrix)
+    timed(timings, 'computePhylTree', repeat,
+          computePhylTree, distMatrix, upgma)
+    
+    sizes = {'image' : list(data.shape), 'lanes' : len(lanes),
+             'bands' : len(bands.records), 'clusters' : len(clusters)}
+    return timings, sizes
+
+def runScenarios(names, repeat):
+    results = {}
+    for name, changes in scenarios:
+        if names and name not in names:
+            continue
+        params = gelParameters(changes)
+        timings, sizes = runScenario(params, repeat)
+        results[name] = {'gel' : params, 'sizes' : sizes, 'timings' : timings}
+    return results
+
+#-------------------------------------------------------------------------------
+
+def showResults(results):
+    print('%-12s %-10s %5s %6s' % ('scenario', 'image', 'lanes', 'bands'),
+          ' '.join('%10s' % stage[:10] for stage in stages))
+    for name, changes in scenarios:
+        if name not in results:
+            continue
+        sizes, timings = results[name]['sizes'], results[name]['timings']
+        print('%-12s %-10s %5d %6d' % (name, '%dx%d' % tuple(sizes['image']),
+                                       sizes['lanes'], sizes['bands']),
+              ' '.join('%9.2fms' % (1000 * timings[stage])
+                       for stage in stages))
+
+def compareResults(baseline, results, threshold):
+    # ratio of the current to the baseline time of every stage; returns the
+    # number of stages slower than threshold times the baseline
+    print('Baseline: Python %s, NumPy %s on %s' % (baseline['python'],
+                                                  baseline['numpy'],
+                                                  baseline['machine']))
+    print('%-12s' % 'scenario', ' '.join('%10s' % stage[:10]
+                                         for stage in stages))
+    slowdowns = 0
+    for name, changes in scenarios:
+        if name not in results or name not in baseline['scenarios']:
+            continue
+        if baseline['scenarios'][name]['gel'] != results[name]['gel']:
+            print('%-12s  other gel parameters, not compared' % name)
+            continue
+        reference = baseline['scenarios'][name]['timings']
+        current = results[name]['timings']
+        columns = []
+        for stage in stages:
+            if stage not in reference: # not timed by the baseline
+                columns.append('%10s' % '-')
+                continue
+            ratio = current[stage] / max(reference[stage], 1e-9)
+            mark = ' '
+            if ratio > threshold:
+                mark = '!'
+                slowdowns += 1
+            columns.append('%8.2fx%s' % (ratio, mark))
+        print('%-12s' % name, ' '.join(columns))
+    print('%d stages slower than %.2fx the baseline (marked with !)'
+          % (slowdowns, threshold))
+    return slowdowns
+
+def main(argv):
+    try:
+        opts, args = getopt.getopt(argv, 'ho:c:r:t:',
+                                   ['help', 'output=', 'compare=', 'repeat=',
+                                    'threshold='])
+    except getopt.GetoptError:
+        usage(str(sys.exc_info()[1]))
+        return 2
+    
+    outputFile = None
+    compareFile = None
+    repeat = 3
+    threshold = slowdownRatio
+    for o, a in opts:
+        if o in ('-h', '--help'):
+            usage()
+            return 0
+        elif o in ('-o', '--output'):
+            outputFile = a
+        elif o in ('-c', '--compare'):
+            compareFile = a
+        elif o in ('-r', '--repeat'):
+            repeat = int(a)
+        elif o in ('-t', '--threshold'):
+            threshold = float(a)
+    
+    unknown = set(args) - set(name for name, changes in scenarios)
+    if unknown:
+        usage('Unknown scenarios %s!' % ', '.join(sorted(unknown)))
+        return 2
+    
+    results = runScenarios(args, repeat)
+    showResults(results)
+    
+    if outputFile != None:
+        with open(outputFile, 'w') as f:
+            json.dump({'python' : sys.version.split()[0],
+                       'numpy' : __import__('numpy').__version__,
+                       'machine' : platform.platform(), 'repeat' : repeat,
+                       'scenarios' : results}, f, sort_keys=True, indent=1)
+    
+    if compareFile != None:
+        with open(compareFile) as f:
+            baseline = json.load(f)
+        return int(compareResults(baseline, results, threshold) > 0)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
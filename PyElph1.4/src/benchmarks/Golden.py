@@ -0,0 +1,274 @@
+'''
+    PyElph - Golden outputs and stage timings of the analysis
+    Copyright (C) 2012  Ana Brandusa Pavel <anabrandusa@gmail.com>,
+                        Cristian Ioan Vasile <cristian.ioan.vasile@gmail.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+from __future__ import print_function
+import getopt
+import hashlib
+import json
+import os
+import sys
+import time
+
+#numpy
+from numpy import allclose, array
+
+#Gel Analysis
+from analysis.BackgroundSubstraction import backgroundSubstraction
+from analysis.Lane import extractLanes
+from analysis.Bands import extractBands, bandMatching, computeMatchMatrix
+from analysis.PhylTree import distanceMatrix, similarityMatrix, \
+    computePhylogeneticTree, treeMethods
+
+from benchmarks.SyntheticGel import syntheticGel
+
+
+# The reference outputs are not those of the original PyElph 1.4 release:
+# they were recorded from the tree after the union-find band matching
+# (user-018, commit 53c2092) with the stable sort of the band gaps of commit
+# 3f17bd0 and the NumPy compatibility fixes of the Python 3 port, under
+# Python 2.7 / NumPy 1.16. Output changes of the earlier commits (user-001 to
+# user-018) are not covered by the check.
+goldenFile = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          'golden.json')
+
+# parameters of the synthetic gels
+goldenCases = [
+    {'seed' : 0},
+    {'seed' : 1, 'noLanes' : 6, 'noBands' : 5},
+    {'seed' : 2, 'noLanes' : 20, 'noise' : 4},
+    {'seed' : 3, 'noBands' : 15, 'height' : 600},
+    {'seed' : 4, 'laneWidth' : 30, 'gap' : 6, 'noise' : 12},
+    {'seed' : 5, 'noLanes' : 16, 'noBands' : 4, 'height' : 300},
+]
+
+markerLanes = [0]
+matchDistance = 2.0 # percent of the image height, as in the GUI
+
+# methods without golden trees of their own, they have to build the trees of
+# another method
+sameTrees = {'Neighbour Joining (Fast)' : 'Neighbour Joining'}
+
+# methods whose trees are unrooted: the pair joined at four nodes and its
+# complement have the same Q, so the root can move with the rounding noise
+unrootedTrees = ['Neighbour Joining', 'Neighbour Joining (Fast)']
+
+stages = ['lanes', 'background', 'bands', 'matching', 'similarity', 'tree']
+
+
+def usage(msg=''):
+    if msg:
+        sys.stderr.write(msg + '\n')
+    sys.stderr.write('''Usage: python -m benchmarks.Golden [options] record|check
+  record                 - write the outputs and timings of this version
+  check                  - compare with the recorded outputs, show speedups
+options:
+  -h | --help            - print help message
+  -f | --file file       - golden file (default: %s)
+  -r | --repeat n        - runs per stage, the fastest is kept (default: 3)
+''' % goldenFile)
+
+def timed(timings, stage, repeat, function, *args):
+    best = None
+    for k in range(repeat):
+        start = time.time()
+        result = function(*args)
+        seconds = time.time() - start
+        if best == None or seconds < best:
+            best = seconds
+    timings[stage] = timings.get(stage, 0.0) + best
+    return result
+
+def runCase(case, repeat=1, timings=None):
+    # outputs of every analysis stage for one synthetic gel
+    if timings == None:
+        timings = {}
+    data = syntheticGel(**case)
+    outputs = {}
+    
+    lanes, laneWidth = timed(timings, 'lanes', repeat, extractLanes, data)
+    outputs['lanes'] = [list(lane) for lane in lanes]
+    outputs['laneWidth'] = float(laneWidth)
+    
+    back = timed(timings, 'background', repeat,
+                 backgroundSubstraction, data, lanes)
+    outputs['background'] = hashlib.md5(back.tobytes()).hexdigest()
+    
+    bands = timed(timings, 'bands', repeat, extractBands, back, lanes)
+    outputs['bands'] = bands.tolist()
+    
+    distance = int(matchDistance * data.shape[0] / 100)
+    def matchBands():
+        matchBands = bands.dropLanes(markerLanes)
+        clusters = bandMatching(matchBands, distance)
+        return matchBands, computeMatchMatrix(matchBands, len(clusters))
+    matchBands, matrix = timed(timings, 'matching', repeat, matchBands)
+    outputs['clusters'] = matchBands.tolist()
+    outputs['matrix'] = matrix.astype(int).tolist()
+    
+    def similarity():
+        simMatrix = similarityMatrix(matrix)
+        return simMatrix, distanceMatrix(simMatrix)
+    simMatrix, distMatrix = timed(timings, 'similarity', repeat, similarity)
+    outputs['similarity'] = simMatrix.tolist()
+    
+    outputs['trees'] = {}
+    for name in sorted(treeMethods):
+        stage = 'tree'
+        if name in sameTrees: # not in the reference timings
+            stage = 'tree (%s)' % name
+        tree, dist = timed(timings, stage, repeat, computePhylogeneticTree,
+                           distMatrix, treeMethods[name])
+        if name in unrootedTrees:
+            outputs['trees'][name] = treeSplits(tree, dist)
+        else:
+            outputs['trees'][name] = treeClades(tree, dist)
+    return outputs
+
+def treeClades(tree, dist):
+    # the leaves under every node with its distance to the parent, sorted by
+    # the leaves; equal trees give equal clades whatever the numbering of
+    # their inner nodes (it changes with the order of tied joins)
+    tree = array(tree).astype(int).ravel().tolist()
+    dist = array(dist).ravel().tolist()
+    leaves = [[] for parent in tree]
+    for node, parent in enumerate(tree):
+        if node not in tree: # the parents come after their children
+            leaves[node].append(node)
+        if parent >= 0:
+            leaves[parent].extend(leaves[node])
+    order = sorted(range(len(tree)), key=lambda node: sorted(leaves[node]))
+    return {'clades' : [sorted(leaves[node]) for node in order],
+            'dist' : [dist[node] for node in order]}
+
+def treeSplits(tree, dist):
+    # the edges of the unrooted tree as the leaves on the side without leaf 0
+    # and their lengths; the two nodes without a parent share one edge
+    clades = treeClades(tree, dist)
+    allLeaves = set(leaves[0] for leaves in clades['clades']
+                    if len(leaves) == 1)
+    lengths = {}
+    for leaves, length in zip(clades['clades'], clades['dist']):
+        if len(leaves) == len(allLeaves): # a root node, if any
+            continue
+        if 0 in leaves:
+            leaves = sorted(allLeaves.difference(leaves))
+        lengths[tuple(leaves)] = lengths.get(tuple(leaves), 0.0) + length
+    splits = sorted(lengths)
+    return {'splits' : [list(split) for split in splits],
+            'dist' : [lengths[split] for split in splits]}
+
+def compareOutputs(golden, outputs, path=''):
+    # differences between two output structures, floats are compared with a
+    # relative tolerance
+    if isinstance(golden, dict):
+        differences = []
+        for key in sorted(set(golden) | set(outputs)):
+            if key not in golden or key not in outputs:
+                differences.append('%s/%s: missing' % (path, key))
+            else:
+                differences.extend(compareOutputs(golden[key], outputs[key],
+                                                  '%s/%s' % (path, key)))
+        return differences
+    if isinstance(golden, float) or (isinstance(golden, list) and golden
+                                     and isinstance(golden[0], float)):
+        if array(golden).shape == array(outputs).shape \
+           and allclose(golden, outputs, rtol=1e-9, atol=1e-9):
+            return []
+    elif golden == outputs:
+        return []
+    return ['%s: %s != %s' % (path, str(golden)[:60], str(outputs)[:60])]
+
+def runCases(repeat):
+    timings = {}
+    outputs = [runCase(case, repeat, timings) for case in goldenCases]
+    return outputs, timings
+
+#-------------------------------------------------------------------------------
+
+def record(filename, repeat):
+    outputs, timings = runCases(repeat)
+    with open(filename, 'w') as f:
+        json.dump({'python' : sys.version.split()[0],
+                   'numpy' : __import__('numpy').__version__,
+                   'cases' : goldenCases, 'outputs' : outputs,
+                   'timings' : timings}, f, sort_keys=True, indent=1)
+    print('Recorded %d cases to %s' % (len(goldenCases), filename))
+    return 0
+
+def check(filename, repeat):
+    with open(filename) as f:
+        golden = json.load(f)
+    if golden['cases'] != goldenCases:
+        print('The golden file was recorded for other cases!')
+        return 2
+    outputs, timings = runCases(repeat)
+    
+    failed = 0
+    for case, expected, current in zip(goldenCases, golden['outputs'],
+                                       outputs):
+        for name, other in sameTrees.items():
+            if name not in expected['trees']:
+                expected['trees'][name] = expected['trees'][other]
+        differences = compareOutputs(expected, current)
+        if differences:
+            failed += 1
+            print('Case %s differs:' % case)
+            for line in differences:
+                print('  ' + line)
+    
+    print('Reference: Python %s, NumPy %s' % (golden['python'],
+                                              golden['numpy']))
+    print('%-12s %12s %12s %8s' % ('stage', 'reference', 'current',
+                                    'speedup'))
+    for stage in stages:
+        reference, current = golden['timings'][stage], timings[stage]
+        print('%-12s %11.4fs %11.4fs %7.2fx' % (stage, reference, current,
+                                                reference / max(current, 1e-9)))
+    print('%d of %d cases match the golden outputs'
+          % (len(goldenCases) - failed, len(goldenCases)))
+    return int(failed > 0)
+
+def main(argv):
+    try:
+        opts, args = getopt.getopt(argv, 'hf:r:', ['help', 'file=', 'repeat='])
+    except getopt.GetoptError:
+        usage(str(sys.exc_info()[1]))
+        return 2
+    
+    filename = goldenFile
+    repeat = 3
+    for o, a in opts:
+        if o in ('-h', '--help'):
+            usage()
+            return 0
+        elif o in ('-f', '--file'):
+            filename = a
+        elif o in ('-r', '--repeat'):
+            repeat = int(a)
+    
+    if args == ['record']:
+        return record(filename, repeat)
+    if args == ['check']:
+        return check(filename, repeat)
+    usage('Specify record or check!')
+    return 2
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
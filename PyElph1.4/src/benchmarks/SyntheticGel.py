@@ -0,0 +1,67 @@
+'''
+    PyElph - Deterministic synthetic gel images
+    Copyright (C) 2012  Ana Brandusa Pavel <anabrandusa@gmail.com>,
+                        Cristian Ioan Vasile <cristian.ioan.vasile@gmail.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+import math
+
+#numpy
+from numpy import clip, zeros
+from numpy.random import RandomState
+
+
+def bandProfile(amplitude=180, sigma=2.0):
+    # gaussian band cross-section as integers, so that the images do not
+    # depend on the floating point functions of the platform
+    radius = int(math.ceil(4 * sigma))
+    return [int(amplitude * math.exp(-0.5 * (d / sigma)**2) + 0.5)
+            for d in range(-radius, radius + 1)]
+
+def smileShift(k, noLanes, smile):
+    # rows the bands of lane k run further than those of the outer lanes,
+    # a parabola across the gel with its top (smile rows) at the middle
+    if noLanes < 2:
+        return 0
+    offset = 2 * k - (noLanes - 1)
+    return smile - smile * offset * offset // ((noLanes - 1) * (noLanes - 1))
+
+def syntheticGel(seed=0, noLanes=12, laneWidth=20, gap=10, noBands=8,
+                 height=400, noise=8, smile=0):
+    # 8-bit gel with noLanes lanes of noBands bands each at random rows, on a
+    # background with uniform integer noise; the bands of the middle lanes
+    # are moved down by up to smile rows; the same seed and parameters give
+    # the same image with any Python and NumPy version
+    rand = RandomState(seed)
+    width = noLanes * (laneWidth + gap) + gap
+    data = zeros((height, width), dtype='int32') + 20
+    
+    profile = bandProfile()
+    radius = len(profile) // 2
+    margin = radius + 2
+    for k in range(noLanes):
+        idxBegin = gap + k * (laneWidth + gap)
+        lane = data[:, idxBegin:idxBegin+laneWidth]
+        lane += 15
+        shift = smileShift(k, noLanes, smile)
+        for y in rand.randint(margin, height - margin - smile,
+                              noBands).tolist():
+            y += shift
+            for d in range(-radius, radius + 1):
+                lane[y + d] += profile[d + radius]
+    
+    data += rand.randint(-noise, noise + 1, data.shape).astype('int32')
+    return clip(data, 0, 255).astype('uint8')
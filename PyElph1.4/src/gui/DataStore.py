@@ -23,6 +23,8 @@ import os.path
 
 from numpy import loadtxt
 
+from LaneIndex import LaneIndex
+
 
 class DataStore:
 
@@ -46,6 +48,7 @@ class DataStore:
         if level < 2 and self.modified:
             # Detect Lanes Page
             self.lanes = None
+            self.laneIndex = LaneIndex()
             self.laneWidth = -1
             self.maxDev = -1
             self.back = None #computed, not saved
@@ -56,6 +59,7 @@ class DataStore:
             self.filterThreshold = -1
             self.filterWidth = -1
             self.filterPasses = -1
+            self.filterSmoothing = None
         
         if level < 4 and self.modified:
             # Band Weight Page
@@ -83,9 +87,6 @@ class DataStore:
             self.showTreeDistanceLabels = False
             self.showBackgroundSubstraction = False
             
-            self.laneLines = []
-            self.bandLines = []
-            self.bandMatchLines = []
             self.treeLines = []
             self.treeTexts = []
             
@@ -133,6 +134,31 @@ class DataStore:
     def cloneLaneNames(self):
         self.laneNames = self.laneLabels[:]
 
+#-------------------------------------------------------------------------------
+    # the lanes are changed only here, to keep their index up to date
+
+    def setLanes(self, lanes):
+        self.lanes = lanes
+        self.laneIndex.reset(lanes)
+
+    def findLane(self, x):
+        if self.lanes == None:
+            return -1
+        return self.laneIndex.find(x)
+
+    def insertLane(self, lane):
+        if self.lanes == None:
+            self.setLanes([])
+        idx = self.laneIndex.insertPosition(lane)
+        if idx >= 0:
+            self.lanes.insert(idx, lane)
+            self.laneIndex.insert(idx, lane)
+        return idx
+
+    def removeLane(self, idx):
+        del self.lanes[idx]
+        self.laneIndex.remove(idx)
+
 #-------------------------------------------------------------------------------
 
     def saveData(self):
@@ -157,6 +183,7 @@ class DataStore:
             print>>dataFile, 'Filter threshold:', self.filterThreshold
             print>>dataFile, 'Filter width:', self.filterWidth
             print>>dataFile, 'Filter passes:', self.filterPasses
+            print>>dataFile, 'Filter smoothing:', self.filterSmoothing
         
             # Band Weight Page
             print>>dataFile, 'Weight model:', self.weightModel
@@ -24,18 +24,22 @@ import wx
 import Image
 
 #numpy
-from numpy import array, argwhere
+from numpy import argwhere, asarray, ceil, floor
 
 #matplotlib
 import matplotlib
 matplotlib.use('WXAgg')
 from matplotlib.backends.backend_wxagg import FigureCanvasWxAgg as FigureCanvas
 from matplotlib.figure import Figure
-from matplotlib.lines import Line2D
 import matplotlib.cm as cm
 
 #Gel Analysis
 from GelToolbar import GelToolbar
+from analysis.BandTable import BandTable
+from analysis.GelImage import GelImage, openGelImage
+from analysis.Lane import levelRange
+from ImagePyramid import imagePyramid, clearPyramids
+from OverlayLayer import OverlayLayer
 
 
 class GelDataWindow(wx.Panel):
@@ -43,9 +47,13 @@ class GelDataWindow(wx.Panel):
     def __init__(self, parent, id, maxRes=(600, 400)):
         wx.Panel.__init__(self, parent, id)
         
-        self.maxRes = maxRes
+        self.maxRes = maxRes # used until the canvas has a size
         self.originalImage = None #save original image for undo and stuff
         self.image = None
+        self.pyramid = None # display levels of image
+        self.imageArtist = None
+        self.imageBox = None # image region shown by imageArtist
+        self.updatingView = False
         self.imageWithBackg = None #used to restore background
         self.data = None # data from transformed image, but with background
         
@@ -105,6 +113,10 @@ class GelDataWindow(wx.Panel):
         
         
         self.canvas = FigureCanvas(self, wx.ID_ANY, self.figure)
+        
+        # lanes and bands over the image
+        self.overlays = OverlayLayer(self.imagePort, self.laneColors,
+                                     self.laneSelectColors)
 
         self.sizer = wx.BoxSizer(wx.VERTICAL)
         self.sizer.Add(self.canvas, 1, wx.LEFT | wx.TOP | wx.GROW)
@@ -114,6 +126,7 @@ class GelDataWindow(wx.Panel):
         self.addToolbar()  # comment this out for no toolbar
         
         self.Bind(wx.EVT_SIZE, self.OnSize)
+        self.canvas.mpl_connect('resize_event', self.OnViewChanged)
 
     def OnSize(self, event):
         if self.Parent.options.step == 5: #TODO: bug with limits on resize 
@@ -161,35 +174,74 @@ class GelDataWindow(wx.Panel):
 
     def ShowImage(self, filename):
         if filename != None:
-            # open file
-            self.image = Image.open(filename).convert('L')
+            # open file (large TIFF scans are memory-mapped, 16-bit images
+            # are analysed in 16 bits)
+            clearPyramids()
+            self.image = openGelImage(filename)
             self.originalImage = self.image.copy()
             self.SetImage()
             return self.image.size
             
     def SetImage(self):
-        # create thumbnail image to draw
-        resizeImg = self.image.copy()
-        resizeImg.thumbnail(self.maxRes)
-        
-        # extract data to draw
-        data = array(resizeImg.getdata()).reshape(
-                                (resizeImg.size[1], resizeImg.size[0]))
+        # display data at the resolution of the view, from the pyramid of the
+        # image (cached, so restoring an image does not rebuild it)
+        self.pyramid = imagePyramid(self.image)
+        size = self.image.size
+        data, self.imageBox = self.pyramid.view((0, 0, size[0], size[1]),
+                                                self.ViewResolution())
 #            print data.shape
         
         # draw image
         self.imagePort.clear()
         self.laneSpectrum.clear()
         self.laneLevels.clear()
-        size = self.image.size
-        self.imagePort.imshow(data, cmap=cm.gray,\
+        self.imageArtist = self.imagePort.imshow(data, cmap=cm.gray,\
                               interpolation='nearest', origin='upper',\
-                              extent=(0, size[0], 0, size[1]))
+                              extent=self.ImageExtent(self.imageBox))
+        self.overlays.attach()
+        # zoom and pan show the pyramid level matching the new limits
+        self.imagePort.callbacks.connect('xlim_changed', self.OnViewChanged)
+        self.imagePort.callbacks.connect('ylim_changed', self.OnViewChanged)
         self.canvas.draw()
         
         # reset toolbar
         self.toolbar.reset()
     
+    def ViewResolution(self):
+        width, height = self.imagePort.bbox.width, self.imagePort.bbox.height
+        if width < 2 or height < 2:
+            return self.maxRes
+        return int(width), int(height)
+    
+    def ImageExtent(self, box):
+        # box is in image pixels (y down), the axes have y up
+        x0, y0, x1, y1 = box
+        return (x0, x1, self.image.size[1] - y1, self.image.size[1] - y0)
+    
+    def OnViewChanged(self, *args):
+        if self.updatingView or self.image == None \
+           or self.imageArtist not in self.imagePort.images:
+            return
+        
+        # visible part of the image
+        height = self.image.size[1]
+        x0, x1 = sorted(self.imagePort.get_xlim())
+        y0, y1 = sorted(self.imagePort.get_ylim())
+        box = (int(floor(x0)), int(floor(height - y1)),
+               int(ceil(x1)), int(ceil(height - y0)))
+        
+        self.updatingView = True
+        try:
+            data, self.imageBox = self.pyramid.view(box, self.ViewResolution())
+            self.imageArtist.set_data(data)
+            # set_extent autoscales the axes, the limits have to stay
+            autoscale = self.imagePort.get_autoscale_on()
+            self.imagePort.set_autoscale_on(False)
+            self.imageArtist.set_extent(self.ImageExtent(self.imageBox))
+            self.imagePort.set_autoscale_on(autoscale)
+        finally:
+            self.updatingView = False
+    
     def RestoreImage(self):
         self.image = self.originalImage.copy()
         self.SetImage()
@@ -200,8 +252,8 @@ class GelDataWindow(wx.Panel):
     
     def SaveImageWithBackground(self):
         self.imageWithBackg = self.image.copy()
-        self.Parent.dataStore.data = array(self.image.getdata()) \
-                     .reshape((self.image.size[1], self.image.size[0]))
+        # uint8 (or uint16) pixels, no per pixel Python objects
+        self.Parent.dataStore.data = asarray(self.image)
     
     def RestoreBackground(self, all=True):
         self.image = self.imageWithBackg.copy()
@@ -217,7 +269,7 @@ class GelDataWindow(wx.Panel):
             back = removeBack(data, self.Parent.dataStore.lanes)
             self.Parent.dataStore.back = back
         
-        self.image = Image.fromarray(self.Parent.dataStore.back)
+        self.image = GelImage(self.Parent.dataStore.back)
         self.Parent.dataStore.showBackgroundSubstraction = True
         
         self.SetImage()
@@ -246,17 +298,9 @@ class GelDataWindow(wx.Panel):
     # Lane Methods
     def SelectLane(self, x, getLevels):
 #        print 'select lane lines'
-        if self.Parent.dataStore.selectedLane >=0:
-            idx = self.Parent.dataStore.selectedLane
-            lines = self.Parent.dataStore.laneLines[idx]
-            map(lambda line, c: line.set_color(c), lines, self.laneColors)
-        
-        idx = ''.join(map(lambda lane: str(int(lane[0] <= x <= lane[1])),
-                          self.Parent.dataStore.lanes)).find('1')
+        idx = self.Parent.dataStore.findLane(x)
+        self.overlays.selectLane(idx)
         if idx >= 0:
-            lines = self.Parent.dataStore.laneLines[idx]
-            map(lambda line, c: line.set_color(c), lines, self.laneSelectColors)
-            
             levels = getLevels(self.Parent.dataStore.data,
                                self.Parent.dataStore.lanes[idx])
             self.SetLaneLevels(levels) #TODO: compatibility
@@ -269,112 +313,38 @@ class GelDataWindow(wx.Panel):
 #        print 'deselect lane lines'
         if self.Parent.dataStore.selectedLane >=0 \
            and self.Parent.dataStore.hasLanes():
-            idx = self.Parent.dataStore.selectedLane
-            lines = self.Parent.dataStore.laneLines[idx]
-            map(lambda line, c: line.set_color(c), lines, self.laneColors)
+            self.overlays.selectLane(-1)
             self.SetLaneLevels(None)
             self.Parent.dataStore.selectedLane = -1
     
     def AddLane(self, newLane):
-        lanes = self.Parent.dataStore.lanes
-        if lanes == None:
-            self.Parent.dataStore.lanes = lanes = []
-        
-#        print newLane, lanes
-        if len(lanes) == 0:
-            idx = 0
-        elif len(lanes) == 1:
-            idx = -1
-            if lanes[0][1] < newLane[0]:
-                idx = 1
-            elif newLane[1] < lanes[0][0]:
-                idx = 0
-        else:
-#            print lanes[:-1]
-#            print lanes[1:]
-#            print ''.join(map(lambda lane, nextLane:
-#                  str(int(lane[1] <= newLane[0] and newLane[1] <= nextLane[0])),
-#                  lanes[:-1], lanes[1:]))
-            idx = ''.join(map(lambda lane, nextLane:
-                  str(int(lane[1] <= newLane[0] and newLane[1] <= nextLane[0])),
-                  lanes[:-1], lanes[1:])).find('1')
-#            print idx
-            if idx == -1:
-                if lanes[-1][1] < newLane[0]:
-                    idx = len(lanes)
-                elif newLane[1] < lanes[0][0]:
-                    idx = 0
-            else:
-                idx += 1
-#            print idx
-        
+#        print newLane, self.Parent.dataStore.lanes
+        idx = self.Parent.dataStore.insertLane(newLane)
         if idx >= 0:
-#            print lanes
-            lanes.insert(idx, newLane)
-            idxBegin, idxEnd = newLane
-            idxMiddle = (idxBegin + idxEnd)/2
-            
-            self.Parent.dataStore.laneLines.insert(idx,
-                   tuple(map(lambda x, c: self.imagePort.add_line(Line2D([x, x],
-                              [0, self.image.size[1]], color=c, linewidth=1.2)),
-                          (idxBegin, idxMiddle, idxEnd), self.laneColors) )
-                )
-            
-            texts = self.Parent.dataStore.treeTexts
-            texts.insert(idx,
-                         self.imagePort.text(idxMiddle+1, self.image.size[1]-1,
-                                    '%d' % (idx+1), color='w',
-                                    ha='left', va='top'))
-
-            for k in range(idx+1, len(texts)):
-                texts[k].set_text('%d' % (k+1))
+            self.overlays.setLanes(self.Parent.dataStore.lanes,
+                                   self.image.size[1])
+            self.overlays.update()
 #            print lanes
             self.Parent.dataStore.modified = True
         else:
             self.ShowInvalidLaneWarning()
     
     def RemoveLane(self, x):
-        idx = ''.join(map(lambda lane: str(int(lane[0] <= x <= lane[1])),
-                          self.Parent.dataStore.lanes)).find('1')
+        idx = self.Parent.dataStore.findLane(x)
         
         if idx >= 0:
 #            print self.Parent.dataStore.lanes
-            del self.Parent.dataStore.lanes[idx]
-            laneLines = self.Parent.dataStore.laneLines[idx]
-            map(lambda line: self.imagePort.lines.remove(line), laneLines)
-            del self.Parent.dataStore.laneLines[idx]
+            self.Parent.dataStore.removeLane(idx)
 #            print self.Parent.dataStore.lanes
-
-            texts = self.Parent.dataStore.treeTexts
-            self.imagePort.texts.remove(texts[idx])
-            del texts[idx]
-            for k in range(idx, len(texts)):
-                texts[k].set_text('%d' % (k+1))
-
-            self.OnPaint(None)
+            self.overlays.setLanes(self.Parent.dataStore.lanes,
+                                   self.image.size[1])
+            self.overlays.update()
             self.Parent.dataStore.modified = True
     
     def SetLaneLines(self, lanes):
 #        print 'set lane lines'
-        self.Parent.dataStore.laneLines = []
-        self.imagePort.lines = []
-        self.Parent.dataStore.treeTexts = []
-        self.imagePort.texts = []
-        k=0
-        for idxBegin, idxEnd in lanes:
-            idxMiddle = (idxBegin + idxEnd)/2
-            self.Parent.dataStore.laneLines.append(
-                tuple(map(lambda x, c: self.imagePort.add_line(Line2D([x, x],
-                              [0, self.image.size[1]], color=c, linewidth=1.2)),
-                          (idxBegin, idxMiddle, idxEnd), self.laneColors) )
-                )
-            self.Parent.dataStore.treeTexts.append(
-                self.imagePort.text(idxMiddle+1, self.image.size[1]-1,
-                                    '%d' % (k+1), color='w',
-                                    ha='left', va='top')
-                )
-            k += 1
-        self.OnPaint(None)
+        self.overlays.setLanes(lanes, self.image.size[1])
+        self.overlays.update()
     
     def SetLaneSpectrum(self, clear=False): # TODO: open button in toolbar
 #        print 'set lane spectrum'
@@ -384,7 +354,7 @@ class GelDataWindow(wx.Panel):
             laneData = self.Parent.dataStore.data.max(0)
             self.laneSpectrum.plot(laneData, 'k')
             self.laneSpectrum.set_xlim([0, laneData.size])
-            self.laneSpectrum.set_ylim([0, 255])
+            self.laneSpectrum.set_ylim([0, levelRange(laneData.dtype)])
         self.OnPaint(None)
     
     def SetLaneLevels(self, laneData): # TODO: open button in toolbar
@@ -394,88 +364,43 @@ class GelDataWindow(wx.Panel):
             limy = self.laneLevels.get_ylim()
             self.laneLevels.plot(list(reversed(laneData)),
                                  range(laneData.size), 'k')
-            self.laneLevels.set_xlim([0, 255])
+            self.laneLevels.set_xlim([0, levelRange(laneData.dtype)])
             self.laneLevels.set_ylim(limy)
         self.OnPaint(None)
 
 #-------------------------------------------------------------------------------
     # Band Methods
     def SetBands(self, bands):
-        map(lambda line: self.imagePort.lines.remove(line),
-            self.Parent.dataStore.bandLines)
-        self.Parent.dataStore.bandLines = []
-        xlim = self.imagePort.get_xlim()
-        ylim = self.imagePort.get_xlim()
-        for b in bands:
-            if len(b) > 0:
-                x, y = zip(*b)
-                y = map(lambda val: self.image.size[1] - val, y)
-                self.Parent.dataStore.bandLines.append(
-                 *self.imagePort.plot(x, y, 'bx', mew=1.5) #, markersize=8)
-                )
-        self.imagePort.set_xlim(xlim)
-        self.imagePort.set_xlim(ylim)
-        self.OnPaint(None)
+        self.overlays.setBands(bands, self.image.size[1])
+        self.overlays.update()
     
     def AddBand(self, x, y):
         if self.Parent.dataStore.bands == None:
             self.Parent.dataStore.bands = \
-                                    [[] for lane in self.Parent.dataStore.lanes]
+                                    BandTable(len(self.Parent.dataStore.lanes))
 #        print x, y, self.image.size
         y = int(self.image.size[1] - y)
 #        print x, y, self.image.size
-        idx = ''.join(map(lambda lane: str(int(lane[0] <= x <= lane[1])),
-                          self.Parent.dataStore.lanes)).find('1')
+        idx = self.Parent.dataStore.findLane(x)
         if idx >= 0:
             x = int(sum(self.Parent.dataStore.lanes[idx])/2)
 #            print x
-            b = self.Parent.dataStore.bands[idx]
-            i = ''.join(map(lambda band: str(int(y <= band[1])), b)).find('1')
-#            print i, ''.join(map(lambda band: str(int(y <= band[1])), b))
-#            print b
-            if i >= 0:
-                if b[i][1] != y:
-                    b.insert(i, [x, y])
-            else:
-                b.append([x, y])
-#            print b
+            if self.Parent.dataStore.bands.insert(idx, x, y):
+                self.Parent.dataStore.modified = True
+#            print self.Parent.dataStore.bands[idx]
             self.SetBands(self.Parent.dataStore.bands)
-            
-            self.Parent.dataStore.modified = True
     
     def RemoveBands(self, x0, y0, x1, y1): # TODO:
         y1, y0 = map(lambda val: self.image.size[1] - val, (y0, y1))
-        for b in self.Parent.dataStore.bands:
-            k = 0;
-            while k < len(b):
-                if x0 <= b[k][0] <= x1 and y0 <= b[k][1] <= y1:
-                    del b[k]
-                    self.Parent.dataStore.modified = True
-                else:
-                    k += 1
+        if self.Parent.dataStore.bands.removeBox(x0, y0, x1, y1):
+            self.Parent.dataStore.modified = True
         self.SetBands(self.Parent.dataStore.bands)
 
 #-------------------------------------------------------------------------------
     def SetBandClusters(self, clusters):
-        map(lambda line: self.imagePort.lines.remove(line),
-            self.Parent.dataStore.bandMatchLines)
-        self.Parent.dataStore.bandMatchLines = []
-        xlim = self.imagePort.get_xlim()
-        ylim = self.imagePort.get_xlim()
-        for k, cl in enumerate(clusters):
-            if len(cl) > 0:
-#                print 'cluster:', cl
-                x, y = zip(*cl)[:2]
-                y = map(lambda val: self.image.size[1] - val, y)
-                if k % 2:
-                    self.Parent.dataStore.bandMatchLines.append(
-                                              *self.imagePort.plot(x, y, 'y-o'))
-                else:
-                    self.Parent.dataStore.bandMatchLines.append(
-                                              *self.imagePort.plot(x, y, 'r-o'))
-        self.imagePort.set_xlim(xlim)
-        self.imagePort.set_xlim(ylim)
-        self.OnPaint(None)
+        self.overlays.setClusters(self.Parent.dataStore.bandMatchings,
+                                  clusters, self.image.size[1])
+        self.overlays.update()
     
 #-------------------------------------------------------------------------------
     # Phylogenetic Tree
@@ -604,6 +529,7 @@ class GelDataWindow(wx.Panel):
         self.imagePort.clear()
         self.laneSpectrum.clear()
         self.laneLevels.clear()
+        self.overlays.detach()
         
         length = self.longestPath(tree, dist, -1)[1][0]
         height = 2.0 * len(self.Parent.dataStore.lanes)
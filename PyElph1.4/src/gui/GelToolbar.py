@@ -25,6 +25,8 @@ import wx
 
 #matplotlib
 from matplotlib.backends.backend_wxagg import NavigationToolbar2WxAgg
+from matplotlib.patches import Rectangle
+from matplotlib.transforms import IdentityTransform
 
 #Gel Analysis
 from analysis.Lane import getRawLaneLevels
@@ -149,6 +151,14 @@ class GelToolbar(NavigationToolbar2WxAgg):
         
         self.idSelectLane = self.canvas.mpl_connect('button_press_event',
                                                     self.selectLane)
+        
+        # rubber band of the crop, lane and band tools, in display pixels
+        self.rubberband = Rectangle((0, 0), 0, 0, fill=False, edgecolor='k',
+                                    linestyle='dashed', animated=True,
+                                    transform=IdentityTransform())
+        self.rubberband.set_figure(self.canvas.figure)
+        self.rubberbandAxes = None
+        self.rubberbandBackground = None
     
     def AddToolOption(self, name, idT, icon, handler, sHelp, lHelp, checked=False):
         if checked:
@@ -249,7 +259,6 @@ class GelToolbar(NavigationToolbar2WxAgg):
         if (abs(x-lastx)<5 and not ignoreX) or (abs(y-lasty)<5 and not ignoreY):
             self._xypress = None
             self.release(event)
-            self.draw()
             return False
 
         # transform points to data reference frame
@@ -281,6 +290,67 @@ class GelToolbar(NavigationToolbar2WxAgg):
         
         return (x0, x1, y0, y1)
         
+    def startRubberband(self, a):
+        # the canvas is rendered once, on motion only the rubber band is drawn
+        self.rubberbandAxes = a
+        self.rubberbandBackground = self.canvas.copy_from_bbox(a.bbox)
+    
+    def drawRubberband(self, x0, y0, x1, y1):
+        if self.rubberbandBackground == None:
+            return
+        self.canvas.restore_region(self.rubberbandBackground)
+        self.rubberband.set_bounds(min(x0, x1), min(y0, y1),
+                                   abs(x1 - x0), abs(y1 - y0))
+        self.rubberbandAxes.draw_artist(self.rubberband)
+        self.canvas.blit(self.rubberbandAxes.bbox)
+    
+    def stopRubberband(self):
+        if self.rubberbandBackground == None:
+            return
+        self.canvas.restore_region(self.rubberbandBackground)
+        self.canvas.blit(self.rubberbandAxes.bbox)
+        self.rubberbandBackground = None
+    
+    def pressDrag(self, event, dragHandler):
+        if event.button == 1:
+            self._button_pressed=1
+        elif  event.button == 3:
+            self._button_pressed=3
+        else:
+            self._button_pressed=None
+            return
+
+        x, y = event.x, event.y
+
+        self._xypress=[]
+        for i, a in enumerate(self.canvas.figure.get_axes()):
+            if x is not None and y is not None and a.in_axes(event) \
+                    and a.get_navigate() and a.can_zoom():
+                self._xypress.append(( x, y, a, i, a.viewLim.frozen(),
+                                       a.transData.frozen()))
+        if self._xypress:
+            self.startRubberband(self._xypress[0][2])
+
+        id1 = self.canvas.mpl_connect('motion_notify_event', dragHandler)
+
+        self._ids_zoom = (id1,)
+        self.press(event)
+    
+    def press_rubberband(self, event):
+        self.pressDrag(event, self.drag_rubberband)
+    
+    def drag_rubberband(self, event):
+        if self._xypress:
+            x, y = event.x, event.y
+            lastx, lasty, a = self._xypress[0][:3]
+
+            # clip the rectangle to the axes
+            x1, y1, x2, y2 = a.bbox.extents
+            x, lastx = max(min(x, lastx), x1), min(max(x, lastx), x2)
+            y, lasty = max(min(y, lasty), y1), min(max(y, lasty), y2)
+
+            self.drawRubberband(x, y, lastx, lasty)
+    
     def finishRelease(self, event, saveView=False):
         self._xypress = None
         self._button_pressed = None
@@ -356,6 +426,7 @@ class GelToolbar(NavigationToolbar2WxAgg):
 #-------------------------------------------------------------------------------
 
     def release_crop(self, event):
+        self.stopRubberband()
         coords = self.getCoordinates(event)
         if not coords:
             return
@@ -363,8 +434,6 @@ class GelToolbar(NavigationToolbar2WxAgg):
         
         if self._button_pressed == 1:
             self.Parent.CropImage(x0, y0, x1, y1)
-        else:
-            self.draw()
         
         self.finishRelease(event, True)
 
@@ -374,7 +443,7 @@ class GelToolbar(NavigationToolbar2WxAgg):
             return
         
         self.processOperation(self.ON_CROP_IMAGE, 'CROP', 'crop',
-                              self.press_zoom, self.release_crop)
+                              self.press_rubberband, self.release_crop)
 
 #-------------------------------------------------------------------------------
     
@@ -405,27 +474,7 @@ class GelToolbar(NavigationToolbar2WxAgg):
 
     def press_add_lane(self, event):
 #        print 'the press mouse button in add lane mode callback'
-        if event.button == 1:
-            self._button_pressed=1
-        elif  event.button == 3:
-            self._button_pressed=3
-        else:
-            self._button_pressed=None
-            return
-
-        x, y = event.x, event.y
-
-        self._xypress=[]
-        for i, a in enumerate(self.canvas.figure.get_axes()):
-            if x is not None and y is not None and a.in_axes(event) \
-                    and a.get_navigate() and a.can_zoom():
-                self._xypress.append(( x, y, a, i, a.viewLim.frozen(),
-                                       a.transData.frozen()))
-
-        id1 = self.canvas.mpl_connect('motion_notify_event', self.drag_add_lane)
-
-        self._ids_zoom = (id1,)
-        self.press(event)
+        self.pressDrag(event, self.drag_add_lane)
 
     def drag_add_lane(self, event):
 #        'the drag callback in zoom mode'
@@ -439,9 +488,11 @@ class GelToolbar(NavigationToolbar2WxAgg):
             x, lastx = max(min(x, lastx), x1), min(max(x, lastx), x2)
 #            y, lasty = max(min(y, lasty), y1), min(max(y, lasty), y2)
 
-            self.draw_rubberband(event, x, lasty, lastx, lasty + 8)
+            # preview of the lane, over the whole height of the image
+            self.drawRubberband(x, y1, lastx, y2)
     
     def release_add_lane(self, event):
+        self.stopRubberband()
         coords = self.getCoordinates(event, ignoreY=True)
         if not coords:
             return
@@ -450,9 +501,6 @@ class GelToolbar(NavigationToolbar2WxAgg):
         if self._button_pressed == 1:
 #            print x0, x1, y0, y1
             self.Parent.AddLane((x0, x1))
-            self.draw()
-        else:
-            self.draw()
         
         self.finishRelease(event)
     
@@ -500,6 +548,7 @@ class GelToolbar(NavigationToolbar2WxAgg):
 
     def release_define_lane_width(self, event):
 #        print 'the release mouse button callback in define lane width mode'
+        self.stopRubberband()
         coords = self.getCoordinates(event, ignoreY=True)
         if not coords:
             return
@@ -510,9 +559,6 @@ class GelToolbar(NavigationToolbar2WxAgg):
             self.Parent.Parent.dataStore.laneWidth = x1 - x0
             self.Parent.Parent.options.steps[1]['laneWidth'].SetChoice(x1-x0, 'manual')
             self.Parent.Parent.options.steps[1]['maxDev'].SetValue(10)
-            self.draw()
-        else:
-            self.draw()
         
         self.finishRelease(event)
     
@@ -549,6 +595,7 @@ class GelToolbar(NavigationToolbar2WxAgg):
 #-------------------------------------------------------------------------------
 
     def release_remove_band(self, event):
+        self.stopRubberband()
         coords = self.getCoordinates(event)
         if not coords:
             return
@@ -556,9 +603,6 @@ class GelToolbar(NavigationToolbar2WxAgg):
         
         if self._button_pressed == 1:
             self.Parent.RemoveBands(x0, y0, x1, y1)
-            self.draw()
-        else:
-            self.draw()
         
         self.finishRelease(event)
 
@@ -575,7 +619,7 @@ class GelToolbar(NavigationToolbar2WxAgg):
             self.deactivate()
             return
         self.processOperation(self.ON_REMOVE_BAND, 'REMOVE_BAND', 'remove band',
-                              self.press_zoom, self.release_remove_band)
+                              self.press_rubberband, self.release_remove_band)
 
 #-------------------------------------------------------------------------------
 
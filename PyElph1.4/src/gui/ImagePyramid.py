@@ -0,0 +1,90 @@
+'''
+    PyElph - Multi-resolution image pyramid for the image view
+    Copyright (C) 2012  Ana Brandusa Pavel <anabrandusa@gmail.com>,
+                        Cristian Ioan Vasile <cristian.ioan.vasile@gmail.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+#numpy
+from numpy import asarray
+
+
+# pyramids of the last displayed images, most recently used last
+pyramids = {}
+pyramidsOrder = []
+maxPyramids = 4
+
+
+class ImagePyramid(object):
+    # Level k holds every 2**k-th pixel of the image as 8-bit display data.
+    # Levels are built on first use and kept, level 0 is never stored, its
+    # regions are read from the image when the view is zoomed in enough.
+
+    def __init__(self, image):
+        self.image = image
+        self.levels = {}
+
+    def level(self, k):
+        if k not in self.levels:
+            self.levels[k] = asarray(self.image.subsample(2**k).convert('L'))
+        return self.levels[k]
+
+    def levelFor(self, box, resolution):
+        # coarsest level with at least one pixel per screen pixel
+        scale = min(float(box[2] - box[0]) / resolution[0],
+                    float(box[3] - box[1]) / resolution[1])
+        k = 0
+        while 2**(k+1) <= scale:
+            k += 1
+        return k
+
+    def view(self, box, resolution):
+        # display data of box (x0, y0, x1, y1, in pixels, y down) at the
+        # given resolution (width, height) of the screen; returns the data
+        # and the box it covers, which is box aligned to the level pixels
+        width, height = self.image.size
+        x0, y0 = max(0, int(box[0])), max(0, int(box[1]))
+        x1, y1 = min(width, int(box[2])), min(height, int(box[3]))
+        if x1 <= x0 or y1 <= y0:
+            x0, y0, x1, y1 = 0, 0, width, height
+
+        k = self.levelFor((x0, y0, x1, y1), resolution)
+        if k == 0:
+            data = asarray(self.image.crop((x0, y0, x1, y1)).convert('L'))
+            return data, (x0, y0, x1, y1)
+
+        step = 2**k
+        i0, j0 = y0 // step, x0 // step
+        i1, j1 = -(-y1 // step), -(-x1 // step)
+        data = self.level(k)[i0:i1, j0:j1]
+        return data, (j0*step, i0*step, min(width, j1*step),
+                      min(height, i1*step))
+
+
+def imagePyramid(image):
+    # images sharing their pixels (copies, restored images) share the pyramid
+    key = (id(image.data), image.invert, image.shift)
+    if key in pyramids:
+        pyramidsOrder.remove(key)
+    else:
+        if len(pyramidsOrder) >= maxPyramids:
+            del pyramids[pyramidsOrder.pop(0)]
+        pyramids[key] = ImagePyramid(image)
+    pyramidsOrder.append(key)
+    return pyramids[key]
+
+def clearPyramids():
+    pyramids.clear()
+    del pyramidsOrder[:]
@@ -0,0 +1,72 @@
+'''
+    PyElph - Sorted index of the lanes for lookups by position
+    Copyright (C) 2012  Ana Brandusa Pavel <anabrandusa@gmail.com>,
+                        Cristian Ioan Vasile <cristian.ioan.vasile@gmail.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+from bisect import bisect_right
+
+
+class LaneIndex(object):
+    # The lanes are sorted and do not overlap, so the begins and the ends of
+    # the lanes are both sorted and a lane is found by bisection. Adjacent
+    # lanes may share a margin, the first one is returned for it.
+
+    def __init__(self, lanes=None):
+        self.reset(lanes)
+
+    def reset(self, lanes):
+        if lanes == None:
+            lanes = []
+        self.begins = [lane[0] for lane in lanes]
+        self.ends = [lane[1] for lane in lanes]
+
+    def __len__(self):
+        return len(self.begins)
+
+    def find(self, x):
+        # index of the lane containing x, -1 if there is none
+        k = bisect_right(self.begins, x) - 1
+        if k > 0 and x <= self.ends[k-1]:
+            k -= 1
+        if k >= 0 and x <= self.ends[k]:
+            return k
+        return -1
+
+    def insertPosition(self, lane):
+        # where lane goes in the sorted lanes, -1 if it overlaps another lane;
+        # new lanes may touch their neighbours, except before the first lane
+        # and after the last one
+        k = bisect_right(self.begins, lane[0])
+        if len(self.begins) == 0:
+            return 0
+        if k == 0:
+            if lane[1] < self.begins[0]:
+                return 0
+        elif k == len(self.begins):
+            if self.ends[-1] < lane[0]:
+                return k
+        elif self.ends[k-1] <= lane[0] and lane[1] <= self.begins[k]:
+            return k
+        return -1
+
+    def insert(self, idx, lane):
+        self.begins.insert(idx, lane[0])
+        self.ends.insert(idx, lane[1])
+
+    def remove(self, idx):
+        del self.begins[idx]
+        del self.ends[idx]
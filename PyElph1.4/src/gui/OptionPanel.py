@@ -20,7 +20,6 @@
 
 from __future__ import with_statement
 import os
-from copy import deepcopy
 
 import wx
 import wx.grid as wxgrid
@@ -33,9 +32,9 @@ from analysis.BackgroundSubstraction import backgroundSubstraction
 from analysis.Lane import extractLanes
 from analysis.Bands import extractBands, bandMatching, computeMatchMatrix,\
     extractWeightsModel, computeWeights
+from analysis.Lane import smoothingMethods
 from analysis.PhylTree import distanceMatrix, similarityMatrix, \
-        computePhylogeneticTree, singleLinkage, completeLinkage, upgma, wpgma, \
-        neighbourJoining#, centroid, median, ward
+        computePhylogeneticTree, treeMethods, similarityCoefficients
 
 from gui.resources import getResourcesDirectory
 
@@ -326,15 +325,14 @@ class EditMatchMatrixDialog(wx.Dialog):
                 self.grid.SetCellAlignment(i, j, wx.ALIGN_CENTER, wx.ALIGN_CENTER)
     
     def UpdateBands(self, bands):
-        clusters = [[] for i in range(self.grid.NumberRows)]
         for j in range(self.grid.NumberCols):
+            cluster = bands[j]['cluster'] # view of the lane in the table
             k = 0
             for i in range(self.grid.NumberRows):
                 if len(self.grid.GetCellValue(i, j)) > 0:
-                    bands[j][k][2] = i
-                    clusters[i].append(bands[j][k])
+                    cluster[k] = i
                     k += 1
-        return map(lambda cl: sorted(cl, lambda x, y: cmp(x[0], y[0])), clusters)
+        return bands.clusters(self.grid.NumberRows)
     
     def Deselect(self):
         if self.selected[2]:
@@ -460,8 +458,10 @@ class OptionWindow(wx.Panel):
         },
         {'title' : 'Band Detection',
          'description':
-'1. "Detect" button is for automatic band detection \r\n2. If automatic band detection does not work properly, you can: \r\n  a. manually select or remove bands \r\n  b. the intensity "threshold" - the smaller value it gets, the more bands are detected \r\n  c. The moving average filter eliminates the noise caused by the false intensity peaks. The filter width determines how many values are used to compute the average for the current position as follows:\r\n xF[i] = (x[i-width] + ... + x[i-1] + x[i] + x[i+1] + ... + x[i+width])/ (2*width+1).\n\r The passes filter parameter represents the number of times the filter is applied on the data. For small images the recommended filter width is 1 and the number of "filter passes" can be between 0-3, for larger images like: \r\n aprox. 600x400, recommended filter width: 2 and "filter passes": 5; \r\n aprox. 4000x3000, recommended "filter width": 3 and "filter passes": 10 ',
-         'init' : lambda x, y: x.BandDetectionPage(y)
+'1. "Detect" button is for automatic band detection \r\n2. If automatic band detection does not work properly, you can: \r\n  a. manually select or remove bands \r\n  b. the intensity "threshold" - the smaller value it gets, the more bands are detected \r\n  c. The moving average filter eliminates the noise caused by the false intensity peaks. The filter width determines how many values are used to compute the average for the current position as follows:\r\n xF[i] = (x[i-width] + ... + x[i-1] + x[i] + x[i+1] + ... + x[i+width])/ (2*width+1).\n\r The passes filter parameter represents the number of times the filter is applied on the data. For small images the recommended filter width is 1 and the number of "filter passes" can be between 0-3, for larger images like: \r\n aprox. 600x400, recommended filter width: 2 and "filter passes": 5; \r\n aprox. 4000x3000, recommended "filter width": 3 and "filter passes": 10 \r\n  d. The "smoothing" is how the filter passes are computed: "Iterative" applies the filter passes times on integer values, "Kernel" applies all the passes at once without rounding, which is faster for many passes and can move a band by a row, "Kernel (Checked)" also runs the passes one by one without rounding and stops with an error when the two differ',
+         'init' : lambda x, y: x.BandDetectionPage(y),
+         'smoothingMethods' : smoothingMethods,
+         'defaultSmoothing' : 'Iterative'
         },
         {'title' : 'Molecular Weight',
          'description':
@@ -475,18 +475,12 @@ class OptionWindow(wx.Panel):
         },
         {'title' : 'Phylogenetic Tree',
          'description':
-'1. Select the method for tree computation \r\n 2. "View" button displays the tree \r\n3. Check the "Distance labels" if you want to display the genetic distance on the branches \r\n4. "Edit Lane Labels" button allows to rename the labels for the analyzed population (after changing a the labels press "View" button to see the change)',
+'1. Select the method for tree computation and the similarity coefficient of the lanes (the distance is 100 - similarity) \r\n 2. "View" button displays the tree \r\n3. Check the "Distance labels" if you want to display the genetic distance on the branches \r\n4. "Edit Lane Labels" button allows to rename the labels for the analyzed population (after changing a the labels press "View" button to see the change)',
          'init' : lambda x, y: x.PhylogeneticTreePage(y),
-         'methods' : {'Neighbour Joining' : neighbourJoining,
-                      'Single Linkage' : singleLinkage,
-                      'Complete Linkage' : completeLinkage,
-                      'UPGMA' : upgma,
-                      'WPGMA' : wpgma,
-#                      'Centroid' : centroid, #TODO: negative branch distance
-#                      'Median' : median, #TODO: negative branch distance
-#                      'Ward' : ward #TODO: negative branch distance
-                     }, 
-         'defaultMethod' : 'Neighbour Joining'
+         'methods' : treeMethods,
+         'defaultMethod' : 'Neighbour Joining',
+         'coefficients' : similarityCoefficients,
+         'defaultCoefficient' : 'Dice'
         }
     ]
     
@@ -594,12 +588,14 @@ class OptionWindow(wx.Panel):
         elif self.step == 2:
 #            print 'clear band points, if any'
 #            print self.Parent.dataStore.hasLanes(), self.Parent.dataStore.lanes
-            self.Parent.imagePanel.SetBands([])
+            self.Parent.imagePanel.SetBands(None)
 #            print self.Parent.dataStore.hasLanes(), self.Parent.dataStore.lanes
 #            print 'reset controls' # TODO: init properly in future version
             self.steps[2]['filterThreshold'].SetValue(20)
             self.steps[2]['filterWidth'].SetValue(3)
             self.steps[2]['filterPasses'].SetValue(10)
+            self.steps[2]['smoothing'].SetSelection(self.steps[2]['smoothing']\
+                                   .FindString(self.steps[2]['defaultSmoothing']))
         elif self.step == 3:
 #            print 'reset controls' # TODO: init properly in future version
             self.steps[3]['model'].SetSelection(0)
@@ -622,6 +618,8 @@ class OptionWindow(wx.Panel):
             self.steps[5]['distanceLabels'].SetValue(False)
             self.steps[5]['method'].SetSelection(self.steps[5]['method']\
                                     .FindString(self.steps[5]['defaultMethod']))
+            self.steps[5]['coefficient'].SetSelection(self.steps[5]['coefficient']\
+                               .FindString(self.steps[5]['defaultCoefficient']))
         
         self.Parent.dataStore.modified = True #TODO: remove in future version
         self.Parent.dataStore.reset(self.step)
@@ -682,9 +680,6 @@ class OptionWindow(wx.Panel):
 
         if self.step == 4:
             self.Parent.dataStore.cloneLaneNames()
-            self.Parent.dataStore.laneLines = []
-            self.Parent.dataStore.bandLines = []
-            self.Parent.dataStore.bandMatchLines = []
         if self.step == 5:
             dlg = wx.MessageDialog(self.Parent,
                                    'Do you really want to reset all data?',
@@ -698,6 +693,7 @@ class OptionWindow(wx.Panel):
                 self.Parent.imagePanel.imageWithBackg = None
                 self.Parent.imagePanel.data = None
                 self.Parent.imagePanel.imagePort.clear()
+                self.Parent.imagePanel.overlays.detach()
                 self.Parent.imagePanel.laneSpectrum.clear()
                 self.Parent.imagePanel.laneLevels.clear()
                 self.Parent.imagePanel.OnPaint(None)
@@ -712,10 +708,16 @@ class OptionWindow(wx.Panel):
                 self.steps[2]['filterThreshold'].SetValue(20)
                 self.steps[2]['filterWidth'].SetValue(3)
                 self.steps[2]['filterPasses'].SetValue(10)
+                smoothing = self.steps[2]['smoothing']
+                smoothing.SetSelection(smoothing.FindString(
+                                          self.steps[2]['defaultSmoothing']))
                 
                 self.steps[5]['distanceLabels'].SetValue(False)
                 method = self.steps[5]['method']
                 method.SetSelection(method.FindString(self.steps[5]['defaultMethod']))
+                coefficient = self.steps[5]['coefficient']
+                coefficient.SetSelection(coefficient.FindString(
+                                          self.steps[5]['defaultCoefficient']))
                 
                 self.Parent.statusBar.SetStatusText('No image specified', 0)
                 
@@ -830,6 +832,19 @@ class OptionWindow(wx.Panel):
         box.Add(passes, 0, wx.ALL | wx.CENTER)
         scrollPanel.Sizer.Add(box, 0, wx.ALL | wx.LEFT, 5)
         
+        # filter smoothing engine
+        box = wx.BoxSizer(wx.HORIZONTAL)
+        field = wx.StaticText(scrollPanel, wx.ID_ANY, 'Smoothing',
+                              size=(65, -1), style=wx.ST_NO_AUTORESIZE)
+        box.Add(field, 0, wx.ALL | wx.CENTER)
+        smoothing = wx.Choice(scrollPanel, wx.ID_ANY, size=(120, -1),
+                    choices=sorted(self.steps[2]['smoothingMethods'].keys()))
+        smoothing.SetSelection(smoothing.FindString(
+                                          self.steps[2]['defaultSmoothing']))
+        self.steps[2]['smoothing'] = smoothing
+        box.Add(smoothing, 0, wx.ALL | wx.CENTER)
+        scrollPanel.Sizer.Add(box, 0, wx.ALL | wx.LEFT, 5)
+        
         # detect band button
         detect = wx.Button(scrollPanel, wx.ID_ANY, 'Detect', size=(60, 30))
         self.Bind(wx.EVT_BUTTON, self.OnDetectBands, detect)
@@ -942,6 +957,19 @@ class OptionWindow(wx.Panel):
         box.Add(method, 0, wx.ALL | wx.CENTER)
         scrollPanel.Sizer.Add(box, 0, wx.ALL | wx.LEFT, 5)
         
+        # similarity coefficient of the lanes
+        box = wx.BoxSizer(wx.HORIZONTAL)
+        field = wx.StaticText(scrollPanel, wx.ID_ANY, 'Similarity',
+                              size=(50, -1), style=wx.ST_NO_AUTORESIZE)
+        box.Add(field, 0, wx.ALL | wx.CENTER)
+        coefficient = wx.Choice(scrollPanel, wx.ID_ANY, size=(110, -1),
+                        choices=sorted(self.steps[5]['coefficients'].keys()))
+        coefficient.SetSelection(coefficient.FindString(
+                                          self.steps[5]['defaultCoefficient']))
+        self.steps[5]['coefficient'] = coefficient
+        box.Add(coefficient, 0, wx.ALL | wx.CENTER)
+        scrollPanel.Sizer.Add(box, 0, wx.ALL | wx.LEFT, 5)
+        
 #        # tree display method # TODO: future version
 #        box = wx.BoxSizer(wx.HORIZONTAL)
 #        field = wx.StaticText(scrollPanel, wx.ID_ANY, 'Display', size=(40, -1),
@@ -1018,7 +1046,7 @@ class OptionWindow(wx.Panel):
         
 #        print 'Computed lane width:', meanLW 
         
-        self.Parent.dataStore.lanes = lanes
+        self.Parent.dataStore.setLanes(lanes)
         self.Parent.dataStore.laneWidth = meanLW
         self.Parent.dataStore.maxDev = maxDev
         
@@ -1064,16 +1092,27 @@ class OptionWindow(wx.Panel):
         filterTh = self.steps[2]['filterThreshold'].GetValue()
         filterW = self.steps[2]['filterWidth'].GetValue()
         filterP = self.steps[2]['filterPasses'].GetValue()
+        smoothing = self.steps[2]['smoothing'].GetStringSelection()
         
 #        print filterTh, filterW, filterP
         
-        bands = extractBands(back, lanes, filterTh, filterW, filterP)
+        try:
+            bands = extractBands(back, lanes, filterTh, filterW, filterP,
+                                 self.steps[2]['smoothingMethods'][smoothing])
+        except ValueError as error: # the checked kernel differs
+            wx.EndBusyCursor()
+            dlgWarn = wx.MessageDialog(self.Parent, str(error), 'Warning',
+                                       wx.OK | wx.ICON_WARNING)
+            dlgWarn.ShowModal()
+            dlgWarn.Destroy()
+            return
 #        print bands
         
         self.Parent.dataStore.bands = bands
         self.Parent.dataStore.filterThreshold = filterTh
         self.Parent.dataStore.filterWidth = filterW
         self.Parent.dataStore.filterPasses = filterP
+        self.Parent.dataStore.filterSmoothing = smoothing
         
         self.Parent.dataStore.modified = True
         
@@ -1193,10 +1232,9 @@ class OptionWindow(wx.Panel):
     def OnMatchBands(self, event):
         wx.BeginBusyCursor()
         
-        bands = deepcopy(self.Parent.dataStore.bands)
-        
-        for k in sorted(self.Parent.dataStore.markerLanes, reverse=True):
-            del bands[k]
+        # a copy of the table without the marker lanes
+        bands = self.Parent.dataStore.bands.dropLanes(
+                                            self.Parent.dataStore.markerLanes)
         
         self.Parent.dataStore.generateLaneLabels()
         
@@ -1260,13 +1298,16 @@ class OptionWindow(wx.Panel):
             # fetch the required filename and file type
             # TODO: move somewhere else
             defaultFile = 'matrix.txt'
+            coefficients = sorted(similarityCoefficients.keys())
             filters = \
                 'Zero one text files (*.txt)|*.txt' + '|'+ \
                 'Zero one (transposed) text files (*.txt)|*.txt' + '|'+ \
                 'Plus minus text files (*.txt)|*.txt' + '|' + \
-                'Plus minus (transposed) text files (*.txt)|*.txt' + '|' + \
-                'Similarity matrix text files (*.txt)|*.txt' + '|' + \
-                'Distance matrix text files (*.txt)|*.txt'
+                'Plus minus (transposed) text files (*.txt)|*.txt'
+            for kind in ('Similarity', 'Distance'):
+                for name in coefficients:
+                    filters += '|%s matrix (%s) text files (*.txt)|*.txt' \
+                                                                % (kind, name)
             dlg = wx.FileDialog(self.Parent, "Save to file", "", defaultFile,
                                 filters, style=wx.SAVE|wx.OVERWRITE_PROMPT)
             if dlg.ShowModal() == wx.ID_OK:
@@ -1285,11 +1326,16 @@ class OptionWindow(wx.Panel):
                     matrixStr = replace(matrixStr, '1', '+')
                     matrixStr = replace(matrixStr, '0', '-')
                     savetxt(dlg.GetPath(), matrixStr, '%c', ' ')
-                elif dlg.GetFilterIndex() == 4:
-                    simMatrix = similarityMatrix(matrix)
+                elif dlg.GetFilterIndex() < 4 + len(coefficients):
+                    name = coefficients[dlg.GetFilterIndex() - 4]
+                    simMatrix = similarityMatrix(matrix,
+                                                 similarityCoefficients[name])
                     savetxt(dlg.GetPath(), simMatrix, '%.2f')
-                elif dlg.GetFilterIndex() == 5:
-                    distMatrix = distanceMatrix(similarityMatrix(matrix))
+                else:
+                    name = coefficients[dlg.GetFilterIndex() - 4
+                                        - len(coefficients)]
+                    distMatrix = distanceMatrix(similarityMatrix(matrix,
+                                                 similarityCoefficients[name]))
                     savetxt(dlg.GetPath(), distMatrix, '%.2f')
                 wx.EndBusyCursor()
             dlg.Destroy()
@@ -1304,7 +1350,9 @@ class OptionWindow(wx.Panel):
 #        print 'match matrix:'
 #        print matrix
     
-        simMatrix = similarityMatrix(matrix)
+        coefficient = self.steps[5]['coefficient'].GetStringSelection()
+        simMatrix = similarityMatrix(matrix,
+                                     self.steps[5]['coefficients'][coefficient])
 #        print 'similarity matrix:'
 #        print simMatrix
         distMatrix = distanceMatrix(simMatrix)
@@ -0,0 +1,185 @@
+'''
+    PyElph - Lane and band overlays drawn over the gel image
+    Copyright (C) 2012  Ana Brandusa Pavel <anabrandusa@gmail.com>,
+                        Cristian Ioan Vasile <cristian.ioan.vasile@gmail.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+#numpy
+from numpy import concatenate, zeros
+
+#matplotlib
+from matplotlib.collections import LineCollection
+
+
+class OverlayLayer(object):
+    # One artist per kind of overlay (lane lines, lane labels, bands, band
+    # matching lines and points), updated in place. The artists are animated:
+    # a full draw of the canvas renders the image, saves it as background and
+    # then adds the overlays; changing an overlay only restores the background
+    # and blits the overlays over it.
+
+    def __init__(self, axes, laneColors, laneSelectColors):
+        self.axes = axes
+        self.canvas = axes.figure.canvas
+        self.laneColors = laneColors
+        self.laneSelectColors = laneSelectColors
+
+        self.background = None
+        self.attached = False
+        self.laneLines = None
+        self.laneTexts = []
+        self.bandPoints = None
+        self.clusterLines = None
+        self.clusterPoints = None
+
+        self.lanes = []
+        self.selectedLane = -1
+        self.height = 0
+
+        self.canvas.mpl_connect('draw_event', self.OnDraw)
+
+    def attach(self):
+        # new (empty) artists, after the axes were cleared
+        self.laneLines = LineCollection([], linewidths=1.2, animated=True)
+        self.axes.add_collection(self.laneLines, autolim=False)
+        self.laneTexts = []
+        self.bandPoints = self.axes.scatter([], [], marker='x', c='b',
+                                            linewidths=1.5, animated=True)
+        self.clusterLines = LineCollection([], animated=True)
+        self.axes.add_collection(self.clusterLines, autolim=False)
+        self.clusterPoints = self.axes.scatter([], [], marker='o',
+                                               animated=True)
+        self.lanes = []
+        self.selectedLane = -1
+        self.background = None
+        self.attached = True
+
+    def detach(self):
+        # the axes were cleared (or show something else, like the tree)
+        self.attached = False
+        self.background = None
+
+    def artists(self):
+        if not self.attached:
+            return []
+        return [self.laneLines, self.bandPoints, self.clusterLines,
+                self.clusterPoints] + self.laneTexts
+
+#-------------------------------------------------------------------------------
+
+    def OnDraw(self, event):
+        if not self.attached:
+            return
+        self.background = self.canvas.copy_from_bbox(self.axes.bbox)
+        self.drawArtists()
+
+    def drawArtists(self):
+        for artist in self.artists():
+            self.axes.draw_artist(artist)
+
+    def update(self):
+        # redraws only the overlays, over the saved image
+        if self.background == None \
+           or not getattr(self.canvas, 'supports_blit', True):
+            self.canvas.draw()
+            return
+        self.canvas.restore_region(self.background)
+        self.drawArtists()
+        self.canvas.blit(self.axes.bbox)
+
+#-------------------------------------------------------------------------------
+
+    def setLanes(self, lanes, height):
+        if not self.attached:
+            return
+        self.lanes = list(lanes)
+        self.height = height
+        self.selectedLane = -1
+
+        segments = []
+        for idxBegin, idxEnd in self.lanes:
+            idxMiddle = (idxBegin + idxEnd)/2
+            segments.extend([[(x, 0), (x, height)]
+                             for x in (idxBegin, idxMiddle, idxEnd)])
+        self.laneLines.set_segments(segments)
+        self.setLaneColors()
+
+        # one label per lane, the existing texts are reused
+        while len(self.laneTexts) > len(self.lanes):
+            self.laneTexts.pop().remove()
+        while len(self.laneTexts) < len(self.lanes):
+            self.laneTexts.append(self.axes.text(0, 0, '', color='w',
+                                                 ha='left', va='top',
+                                                 animated=True))
+        for k, (idxBegin, idxEnd) in enumerate(self.lanes):
+            self.laneTexts[k].set_position(((idxBegin + idxEnd)/2 + 1,
+                                            height - 1))
+            self.laneTexts[k].set_text('%d' % (k+1))
+
+    def setLaneColors(self):
+        colors = []
+        for k in range(len(self.lanes)):
+            if k == self.selectedLane:
+                colors.extend(self.laneSelectColors)
+            else:
+                colors.extend(self.laneColors)
+        self.laneLines.set_color(colors)
+
+    def selectLane(self, idx):
+        if not self.attached:
+            return
+        self.selectedLane = idx
+        self.setLaneColors()
+
+    def setBands(self, bands, height):
+        if not self.attached:
+            return
+        points = zeros((0, 2))
+        if bands != None:
+            points = bandPoints(bands.records, height)
+        self.bandPoints.set_offsets(points)
+
+    def setClusters(self, bands, clusters, height):
+        # consecutive clusters are drawn in red and yellow; the clusters are
+        # given as indices of their bands in the table
+        if not self.attached:
+            return
+        segments = []
+        lineColors = []
+        points = zeros((0, 2))
+        pointColors = []
+        if bands != None and clusters:
+            points = bandPoints(bands.records, height)
+            for k, cl in enumerate(clusters):
+                if len(cl) > 0:
+                    color = ('r', 'y')[k % 2]
+                    segments.append(points[cl])
+                    lineColors.append(color)
+                    pointColors.extend([color] * len(cl))
+            points = points[concatenate(clusters)]
+        self.clusterLines.set_segments(segments)
+        self.clusterLines.set_color(lineColors)
+        self.clusterPoints.set_offsets(points)
+        self.clusterPoints.set_facecolor(pointColors)
+        self.clusterPoints.set_edgecolor(pointColors)
+
+
+def bandPoints(records, height):
+    # display positions of the bands, the image is drawn with y up
+    points = zeros((len(records), 2))
+    points[:, 0] = records['x']
+    points[:, 1] = height - records['y']
+    return points
@@ -0,0 +1,129 @@
+'''
+    PyElph - Band matching and band table tests
+    Copyright (C) 2012  Ana Brandusa Pavel <anabrandusa@gmail.com>,
+                        Cristian Ioan Vasile <cristian.ioan.vasile@gmail.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+import unittest
+
+#numpy
+from numpy.random import RandomState
+
+#Gel Analysis
+from analysis.BandTable import BandTable
+from analysis.Bands import bandMatching
+
+
+def makeBands(noLanes, bands):
+    # table of the (lane, y) bands, the lanes 10 columns apart
+    table = BandTable(noLanes)
+    for lane, y in bands:
+        table.insert(lane, 10 * lane + 5, y)
+    return table
+
+def bandClusters(table):
+    # (lane, y, cluster) of every band of the table
+    return [(int(band['lane']), int(band['y']), int(band['cluster']))
+            for band in table.records]
+
+
+class BandMatchingTest(unittest.TestCase):
+
+    def testEqualGaps(self):
+        # the gaps 10-15 and 15-20 are equal, the upper one is joined first
+        # and the lower band of lane 0 can not join the same cluster
+        table = makeBands(2, [(0, 10), (1, 15), (0, 20)])
+        clusters = bandMatching(table, 10)
+        self.assertEqual(bandClusters(table), [(0, 10, 0), (0, 20, 1),
+                                               (1, 15, 0)])
+        self.assertEqual([c.tolist() for c in clusters], [[0, 2], [1]])
+        
+        # many equal gaps, which an unstable sort would reorder
+        table = makeBands(2, [(lane, 30 * k + 5 * m) for k in range(40)
+                              for lane, m in ((0, 0), (1, 1), (0, 2))])
+        bandMatching(table, 10)
+        for k in range(40):
+            self.assertEqual(table[1]['cluster'][k], table[0]['cluster'][2*k])
+            self.assertEqual(table[0]['cluster'][2*k+1], 2*k + 1)
+
+    def testOneBandPerLane(self):
+        table = makeBands(2, [(0, 10), (0, 12), (1, 11)])
+        bandMatching(table, 10)
+        self.assertNotEqual(table[0]['cluster'][0], table[0]['cluster'][1])
+        
+        random = RandomState(0)
+        for k in range(50):
+            noLanes = random.randint(1, 8)
+            bands = set(zip(random.randint(0, noLanes, 40),
+                            random.randint(0, 200, 40)))
+            table = makeBands(noLanes, sorted(bands))
+            for cluster in bandMatching(table, 10):
+                lanes = table.records['lane'][cluster]
+                rows = table.records['y'][cluster]
+                self.assertEqual(len(set(lanes)), len(lanes))
+                self.assertTrue(rows.max() - rows.min() <= 10)
+            self.assertTrue((table.records['cluster'] >= 0).all())
+
+    def testDistance(self):
+        table = makeBands(2, [(0, 10), (1, 20)])
+        self.assertEqual(len(bandMatching(table, 10)), 1)
+        table = makeBands(2, [(0, 10), (1, 21)])
+        self.assertEqual(len(bandMatching(table, 10)), 2)
+        
+        # each gap is under the distance, the whole cluster would not be
+        table = makeBands(3, [(0, 10), (1, 16), (2, 22)])
+        bandMatching(table, 10)
+        self.assertEqual(bandClusters(table), [(0, 10, 0), (1, 16, 0),
+                                               (2, 22, 1)])
+
+
+class BandTableTest(unittest.TestCase):
+
+    def setUp(self):
+        self.table = makeBands(3, [(1, 30), (0, 40), (1, 10)])
+
+    def testInsert(self):
+        table = self.table
+        self.assertEqual(table.offsets.tolist(), [0, 1, 3, 3])
+        self.assertEqual(table[1]['y'].tolist(), [10, 30])
+        self.assertFalse(table.insert(1, 15, 30))
+        self.assertTrue(table.insert(2, 25, 5))
+        self.assertTrue(table.insert(1, 15, 20))
+        self.assertEqual(table.offsets.tolist(), [0, 1, 4, 5])
+        self.assertEqual(table.tolist(), [[[5, 40]],
+                                          [[15, 10], [15, 20], [15, 30]],
+                                          [[25, 5]]])
+
+    def testRemoveBox(self):
+        table = self.table
+        self.assertFalse(table.removeBox(0, 0, 30, 5))
+        self.assertTrue(table.removeBox(10, 0, 20, 20))
+        self.assertEqual(table.offsets.tolist(), [0, 1, 2, 2])
+        self.assertEqual(table.tolist(), [[[5, 40]], [[15, 30]], []])
+
+    def testDropLanes(self):
+        table = self.table
+        dropped = table.dropLanes([0])
+        self.assertEqual(len(dropped), 2)
+        self.assertEqual(dropped.offsets.tolist(), [0, 2, 2])
+        self.assertEqual(dropped.records['lane'].tolist(), [0, 0])
+        self.assertEqual(dropped[0]['y'].tolist(), [10, 30])
+        self.assertEqual(table.offsets.tolist(), [0, 1, 3, 3])
+        self.assertEqual(table.records['lane'].tolist(), [0, 1, 1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+'''
+    PyElph - Gel image tests
+    Copyright (C) 2012  Ana Brandusa Pavel <anabrandusa@gmail.com>,
+                        Cristian Ioan Vasile <cristian.ioan.vasile@gmail.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+
+#numpy
+from numpy import arange, asarray
+
+#Gel Analysis
+from analysis.GelImage import GelImage, openGelImage, sampleBits, \
+    tiffMaxSampleValue
+
+
+def writeTiff(filename, data, photometric=1, maxValue=None):
+    # uncompressed 16-bit grayscale TIFF in a single strip
+    tags = [(256, 4, data.shape[1]), (257, 4, data.shape[0]), (258, 3, 16),
+            (259, 3, 1), (262, 3, photometric), (273, 4, 0), (277, 3, 1),
+            (278, 4, data.shape[0]), (279, 4, data.nbytes)]
+    if maxValue != None:
+        tags.append((tiffMaxSampleValue, 3, maxValue))
+    offset = 8 + 2 + 12 * len(tags) + 4
+    with open(filename, 'wb') as f:
+        f.write(struct.pack('<2sHI', b'II', 42, 8))
+        f.write(struct.pack('<H', len(tags)))
+        for tag, fieldType, value in tags:
+            if tag == 273:
+                value = offset
+            fmt = '<HHIH2x' if fieldType == 3 else '<HHII'
+            f.write(struct.pack(fmt, tag, fieldType, 1, value))
+        f.write(struct.pack('<I', 0))
+        f.write(data.astype('<u2').tobytes())
+
+
+class SampleBitsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.data = arange(64 * 64).astype('uint16').reshape(64, 64)
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def testActualMaximum(self):
+        self.assertEqual(sampleBits(self.data), 12)
+        self.assertEqual(sampleBits(self.data[:1, :8]), 8)
+
+    def testConvert(self):
+        image = GelImage(self.data, bits=12)
+        self.assertEqual(image.mode, 'I;16')
+        self.assertEqual(asarray(image).max(), 4095 << 4)
+        self.assertEqual(asarray(image.convert('L')).max(), 255)
+        self.assertEqual(asarray(image.crop((0, 0, 8, 8)).convert('L'))[0, 1],
+                         0)
+        self.assertEqual(asarray(image.convert('L'))[0, 16], 1)
+
+    def testInvert(self):
+        image = GelImage(self.data, invert=True, bits=12)
+        self.assertEqual(asarray(image.convert('L')).max(), 255)
+        self.assertEqual(asarray(image)[0, 0], 4095 << 4)
+
+    def testTiffTags(self):
+        filename = os.path.join(self.folder, 'gel.tif')
+        writeTiff(filename, self.data // 2, maxValue=4095)
+        image = openGelImage(filename)
+        self.assertEqual(image.bits, 12)
+        self.assertEqual(asarray(image.convert('L')).max(), 127)
+
+        writeTiff(filename, self.data // 2)
+        image = openGelImage(filename)
+        self.assertEqual(image.bits, 11)
+        self.assertEqual(asarray(image.convert('L')).max(), 255)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+'''
+    PyElph - Lane and band extraction tests
+    Copyright (C) 2012  Ana Brandusa Pavel <anabrandusa@gmail.com>,
+                        Cristian Ioan Vasile <cristian.ioan.vasile@gmail.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+import unittest
+from multiprocessing.pool import ThreadPool
+
+#numpy
+from numpy import allclose, zeros
+from numpy.random import RandomState
+
+#Gel Analysis
+from analysis.Lane import extractLevelsArray, extractLevelsFormLanes, \
+    movingAverage, kernelMovingAverage, validatedMovingAverage, \
+    smoothingMethods
+from analysis.Bands import extractBands
+
+
+class EmptyLanesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.data = zeros((50, 40), dtype='uint8')
+
+    def testLevelsArray(self):
+        self.assertEqual(extractLevelsArray(self.data, []).shape, (0, 50))
+
+    def testLevelsArrayExecutor(self):
+        pool = ThreadPool(2)
+        try:
+            levels = extractLevelsArray(self.data, [], executor=pool)
+        finally:
+            pool.close()
+            pool.join()
+        self.assertEqual(levels.shape, (0, 50))
+
+    def testLevelsFromLanes(self):
+        self.assertEqual(extractLevelsFormLanes(self.data, []), [])
+
+    def testBands(self):
+        self.assertEqual(len(extractBands(self.data, [])), 0)
+
+
+class KernelMovingAverageTest(unittest.TestCase):
+
+    def testIterativeFilter(self):
+        # the whole profile, with the borders the iterative filter keeps
+        random = RandomState(0)
+        for size in (1, 5, 12, 40, 157):
+            levels = random.randint(0, 5000, (3, size)).astype('float64')
+            for windowWidth in range(0, 5):
+                for passes in range(0, 13):
+                    reference = movingAverage(levels, windowWidth, passes)
+                    y = kernelMovingAverage(levels, windowWidth, passes)
+                    self.assertTrue(allclose(y, reference),
+                                    (size, windowWidth, passes))
+
+    def testIntegerProfiles(self):
+        # integer profiles are smoothed in floating point by the kernel
+        levels = RandomState(1).randint(0, 255, (2, 80))
+        self.assertTrue(allclose(kernelMovingAverage(levels, 3, 10),
+                                 movingAverage(levels.astype('float64'), 3,
+                                               10)))
+
+    def testChecked(self):
+        levels = RandomState(2).randint(0, 255, (4, 100))
+        self.assertTrue(allclose(validatedMovingAverage(levels, 2, 5),
+                                 kernelMovingAverage(levels, 2, 5)))
+        self.assertTrue(smoothingMethods['Kernel (Checked)']
+                        is validatedMovingAverage)
+
+
+if __name__ == '__main__':
+    unittest.main()
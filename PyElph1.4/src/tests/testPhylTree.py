@@ -0,0 +1,112 @@
+'''
+    PyElph - Similarity and phylogenetic tree tests
+    Copyright (C) 2012  Ana Brandusa Pavel <anabrandusa@gmail.com>,
+                        Cristian Ioan Vasile <cristian.ioan.vasile@gmail.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+import unittest
+
+#numpy
+from numpy import allclose, array, isnan, sqrt, zeros
+from numpy.random import RandomState
+
+#Gel Analysis
+from analysis.PhylTree import BandCounts, similarityMatrices, \
+    similarityCoefficients, similarityMatrix, dice, neighbourJoining, \
+    fastNeighbourJoining
+
+
+def patristicDistances(tree, dist, noLeaves):
+    # lengths of the paths between the leaves; the two nodes without a parent
+    # are joined by the edge dist of each
+    tree = [int(parent) for parent in tree]
+    paths = []
+    for leaf in range(noLeaves):
+        path = {}
+        node, length = leaf, 0.0
+        while node >= 0:
+            path[node] = length
+            length += dist[node]
+            node = tree[node]
+        paths.append(path)
+    tops = [node for node, parent in enumerate(tree) if parent < 0]
+    result = zeros([noLeaves, noLeaves])
+    for i in range(noLeaves):
+        for j in range(noLeaves):
+            common = [node for node in paths[i] if node in paths[j]]
+            if common:
+                result[i, j] = min(paths[i][node] + paths[j][node]
+                                   for node in common)
+            else:
+                result[i, j] = sum(paths[i][node] + dist[node]
+                                   for node in tops if node in paths[i]) \
+                             + sum(paths[j][node] + dist[node]
+                                   for node in tops if node in paths[j])
+    return result
+
+
+class SimilarityTest(unittest.TestCase):
+
+    def setUp(self):
+        self.random = RandomState(0)
+
+    def testMultipleBands(self):
+        # a sample can have several bands in the same cluster
+        for k in range(20):
+            data = self.random.randint(0, 4, (30, 8))
+            data[:, 0] = 0 # a sample without bands
+            matrices = similarityMatrices(data, similarityCoefficients.keys())
+            for name, matrix in matrices.items():
+                values = matrix[~isnan(matrix)]
+                self.assertTrue((values >= 0).all() and (values <= 100).all(),
+                                name)
+
+    def testCounts(self):
+        data = self.random.randint(0, 2, (30, 8))
+        counts = BandCounts(data)
+        self.assertTrue((counts.a + counts.b + counts.c + counts.d
+                         == data.shape[0]).all())
+        counts = BandCounts(self.random.randint(0, 4, (30, 8)))
+        for table in (counts.a, counts.b, counts.c, counts.d):
+            self.assertTrue((table >= 0).all())
+
+
+class NeighbourJoiningTest(unittest.TestCase):
+
+    def testFastJoining(self):
+        # the fast search reads the sorted rows up to a bound, it has to find
+        # the joins of the exact search on small matrices too
+        random = RandomState(0)
+        for n in range(3, 11):
+            for k in range(300):
+                points = random.rand(n, 3)
+                D = sqrt(((points[:, None] - points[None])**2).sum(-1)) * 100
+                exact = patristicDistances(*neighbourJoining(D), noLeaves=n)
+                fast = patristicDistances(*fastNeighbourJoining(D, True),
+                                          noLeaves=n)
+                self.assertTrue(allclose(fast, exact), (n, k))
+        
+        # two samples without bands, their distance is nan
+        data = array([[1, 0, 0, 1], [1, 0, 0, 0], [0, 0, 0, 1]])
+        D = 100 - similarityMatrix(data, dice)
+        fast = fastNeighbourJoining(D, True)
+        exact = neighbourJoining(D)
+        self.assertTrue((fast[0] == exact[0]).all())
+        self.assertEqual(fast[1].size, exact[1].size)
+
+
+if __name__ == '__main__':
+    unittest.main()